@@ -0,0 +1,49 @@
+"""Compare decoding stream replies with ``convert_bytes`` and with the specialized
+decoders. Doesn't need a Redis server, replies are generated in the shape returned
+by ``redis-py``.
+
+Usage: python benchmarks/decode.py [messages] [fields]
+"""
+
+import sys
+import timeit
+
+from streamz_redis.sources.consumers import convert_bytes, decode_streams_response
+
+
+def make_reply(n_messages, n_fields, n_streams=2):
+    data = {f"field-{i}".encode(): f"value-{i}".encode() * 4 for i in range(n_fields)}
+    return [
+        [
+            f"stream-{s}".encode(),
+            [(f"1600000000000-{i}".encode(), dict(data)) for i in range(n_messages)],
+        ]
+        for s in range(n_streams)
+    ]
+
+
+def main(n_messages=1000, n_fields=10, repeat=5, number=20):
+    reply = make_reply(n_messages, n_fields)
+    assert convert_bytes(reply) == decode_streams_response(reply)
+
+    cases = {
+        "convert_bytes": lambda: convert_bytes(reply),
+        "decode_streams_response": lambda: decode_streams_response(reply),
+        "decode_streams_response, 1 field": lambda: decode_streams_response(
+            reply, fields=["field-0"]
+        ),
+    }
+    total = 2 * n_messages
+    print(f"{total} messages with {n_fields} fields, best of {repeat}")
+    baseline = None
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        baseline = baseline or best
+        print(
+            f"{name:>36}: {best * 1e3:8.3f} ms, "
+            f"{best / total * 1e6:6.3f} us/message, x{baseline / best:.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:3]))
@@ -0,0 +1,111 @@
+"""Compare parsing ``XREAD`` replies with ``redis-py``'s callbacks followed by
+decoding (the default ``Consumer`` path) and with ``StreamReplyParser``.
+
+Raw replies are generated in the shape returned by the connection, so no server is
+needed. With ``--live``, ``Consumer.consume`` is also timed against a Redis server on
+localhost, with and without ``parse_replies``.
+
+Usage: python benchmarks/parse.py [messages] [fields] [--live]
+"""
+
+import sys
+import timeit
+import uuid
+
+from redis import StrictRedis
+
+try:
+    from redis._parsers.helpers import parse_xread
+except ImportError:  # redis < 5
+    from redis.client import parse_xread
+
+from streamz_redis.sources.consumers import (
+    Consumer,
+    StreamReplyParser,
+    convert_bytes,
+    decode_streams_response,
+)
+
+
+def make_raw_reply(n_messages, n_fields, n_streams=2):
+    pairs = []
+    for i in range(n_fields):
+        pairs.extend([f"field-{i}".encode(), f"value-{i}".encode() * 4])
+    return [
+        [
+            f"stream-{s}".encode(),
+            [[f"1600000000000-{i}".encode(), list(pairs)] for i in range(n_messages)],
+        ]
+        for s in range(n_streams)
+    ]
+
+
+def report(title, cases, total, repeat=5, number=20):
+    print(title)
+    baseline = None
+    for name, fn in cases.items():
+        best = min(timeit.repeat(fn, repeat=repeat, number=number)) / number
+        baseline = baseline or best
+        print(
+            f"{name:>40}: {best * 1e3:8.3f} ms, "
+            f"{best / total * 1e6:6.3f} us/message, x{baseline / best:.1f}"
+        )
+
+
+def offline(n_messages, n_fields):
+    raw = make_raw_reply(n_messages, n_fields)
+    parser = StreamReplyParser()
+    assert parser.streams(raw) == decode_streams_response(parse_xread(raw))
+    report(
+        f"{2 * n_messages} messages with {n_fields} fields, parsing only",
+        {
+            "parse_xread + convert_bytes": lambda: convert_bytes(parse_xread(raw)),
+            "parse_xread + decode_streams_response": lambda: decode_streams_response(
+                parse_xread(raw)
+            ),
+            "StreamReplyParser": lambda: parser.streams(raw),
+        },
+        2 * n_messages,
+    )
+
+
+def live(n_messages, n_fields):
+    client = StrictRedis()
+    stream = str(uuid.uuid4())
+    data = {f"field-{i}": f"value-{i}" * 4 for i in range(n_fields)}
+    pipe = client.pipeline(transaction=False)
+    for _ in range(n_messages):
+        pipe.xadd(stream, data)
+    pipe.execute()
+
+    def consume(parse_replies):
+        consumer = Consumer(
+            StrictRedis(),
+            stream,
+            default_start_id="0",
+            block=1,
+            parse_replies=parse_replies,
+        )
+
+        def run():
+            consumer.streams[stream] = "0"  # read the same messages every time
+            consumer.consume()
+
+        return run
+
+    try:
+        report(
+            f"{n_messages} messages with {n_fields} fields, Consumer.consume",
+            {"default": consume(False), "parse_replies": consume(True)},
+            n_messages,
+        )
+    finally:
+        client.delete(stream)
+
+
+if __name__ == "__main__":
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    n_messages, n_fields = (list(map(int, args)) + [1000, 10][len(args) :])[:2]
+    offline(n_messages, n_fields)
+    if "--live" in sys.argv:
+        live(n_messages, n_fields)
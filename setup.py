@@ -7,8 +7,9 @@ setup(
     packages=find_packages(),
     install_requires=[
         "streamz @ git+https://github.com/python-streamz/streamz.git",
-        "redis>=3.5.3",
+        "redis>=4.2",
     ],
+    extras_require={"numpy": ["numpy"]},
     entry_points={
         "streamz.sources": [
             "from_redis_lists = streamz_redis.sources:from_redis_lists",
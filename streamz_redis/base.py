@@ -1,6 +1,8 @@
 from redis import StrictRedis
 from streamz import Stream
 
+from streamz_redis.pools import get_async_client, get_blocking_client, get_client
+
 
 class RedisNode(Stream):
     """Base class for Redis stream nodes.
@@ -9,19 +11,41 @@ class RedisNode(Stream):
     ----------
 
     client_params: dict
-        Will be passed to ``redis-py`` client instance. Defaults to None.
+        Will be passed to ``redis-py`` client instance. Nodes with equal
+        ``client_params`` share a connection pool. Defaults to None.
     """
 
     def __init__(self, *args, client_params: dict = None, **kwargs):
         self._params = client_params or {}
         self._client = None
+        self._blocking_client = None
+        self._async_client = None
         super().__init__(*args, **kwargs)
 
     @property
     def _redis(self) -> StrictRedis:
         """``redis-py`` client instance bound to this source. Will be created
-        when first accessed.
+        when first accessed. Uses the shared connection pool for ``client_params``.
         """
         if self._client is None:
-            self._client = StrictRedis(**self._params)
+            self._client = get_client(self._params)
         return self._client
+
+    @property
+    def _reader(self) -> StrictRedis:
+        """``redis-py`` client instance with a dedicated connection pool, for blocking
+        commands. Will be created when first accessed.
+        """
+        if self._blocking_client is None:
+            self._blocking_client = get_blocking_client(self._params)
+        return self._blocking_client
+
+    @property
+    def _aredis(self):
+        """``redis.asyncio`` client instance bound to this node, with a dedicated
+        connection pool. Will be created when first accessed. Requires
+        ``redis>=4.2``.
+        """
+        if self._async_client is None:
+            self._async_client = get_async_client(self._params)
+        return self._async_client
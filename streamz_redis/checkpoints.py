@@ -0,0 +1,161 @@
+import json
+import os
+from collections import deque
+from threading import Lock
+
+from streamz_redis.pools import get_client
+
+
+class CheckpointStore:
+    """Abstract class for stores that persist stream positions (the id of the last
+    processed message in each stream) between runs.
+    """
+
+    def load(self, streams: list) -> dict:
+        """Load saved positions of ``streams`` as a dict of ``stream-name: message-id``.
+        Streams with no saved position are left out.
+        """
+        raise NotImplementedError
+
+    def save(self, positions: dict):
+        """Save a dict of ``stream-name: message-id``, updating the positions of
+        these streams only.
+        """
+        raise NotImplementedError
+
+
+class RedisCheckpointStore(CheckpointStore):
+    """Keeps positions in a Redis hash of ``stream-name: message-id``.
+
+    Parameters
+    ----------
+    key: str
+        Name of the hash.
+    client_params: dict
+        Parameters of ``redis-py`` client. The shared connection pool for these
+        parameters is used. Defaults to ``None``.
+    """
+
+    def __init__(self, key: str, client_params: dict = None):
+        self.key = key
+        self.client_params = client_params
+        self._client = None
+
+    @property
+    def redis(self):
+        if self._client is None:
+            self._client = get_client(self.client_params)
+        return self._client
+
+    def load(self, streams: list) -> dict:
+        streams = list(streams)
+        if len(streams) == 0:
+            return {}
+        values = self.redis.hmget(self.key, streams)
+        return {
+            s: v.decode() if isinstance(v, bytes) else v
+            for s, v in zip(streams, values)
+            if v is not None
+        }
+
+    def save(self, positions: dict):
+        if len(positions) > 0:
+            self.redis.hset(self.key, mapping=positions)
+
+
+class FileCheckpointStore(CheckpointStore):
+    """Keeps positions in a local JSON file. The file is replaced atomically on each
+    save, so a crash never leaves it half-written.
+
+    Parameters
+    ----------
+    path: str
+        Path to the file. It's created on the first save.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def load(self, streams: list) -> dict:
+        saved = self._read()
+        return {s: saved[s] for s in streams if s in saved}
+
+    def save(self, positions: dict):
+        with self._lock:
+            saved = self._read()
+            saved.update(positions)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(saved, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+
+
+class Checkpointer:
+    """Tracks which emitted messages are processed downstream and which positions
+    are safe to save.
+
+    Messages can be completed out of order, so the position of a stream only moves
+    past a message once it and all messages emitted before it are done. That way, a
+    restart from a saved position never skips unprocessed messages.
+
+    Parameters
+    ----------
+    store: CheckpointStore
+        Where the positions are saved.
+    every: int
+        Number of processed messages after which ``.due`` becomes True. Defaults to
+        1000.
+    """
+
+    def __init__(self, store: CheckpointStore, every: int = 1000):
+        self.store = store
+        self.every = every
+        self.positions = {}
+        self._inflight = {}
+        self._changed = {}
+        self._processed = 0
+
+    def track(self, stream, *ids):
+        """Register ``ids`` as emitted, in order. Returns a callback to call when
+        all of them are processed.
+        """
+        queue = self._inflight.setdefault(stream, deque())
+        entries = [[_id, False] for _id in ids]
+        queue.extend(entries)
+
+        def cb():
+            for entry in entries:
+                entry[1] = True
+            self._processed += len(entries)
+            while len(queue) > 0 and queue[0][1]:
+                self._changed[stream] = queue.popleft()[0]
+
+        return cb
+
+    @property
+    def due(self) -> bool:
+        """Whether enough messages were processed since the last save."""
+        return self._processed >= self.every
+
+    def collect(self) -> dict:
+        """Positions that moved since the previous call, to be saved. Resets
+        ``.due``.
+        """
+        changed = {
+            s: _id.decode() if isinstance(_id, bytes) else _id
+            for s, _id in self._changed.items()
+        }
+        self.positions.update(changed)
+        self._changed = {}
+        self._processed = 0
+        return changed
@@ -0,0 +1,92 @@
+def to_columns(result: list, schema: dict, encoding: str = "UTF-8") -> dict:
+    """Convert a reply to ``XREAD``/``XREADGROUP`` into a dict of NumPy arrays, one
+    per field in ``schema``, so that a whole batch can be processed without looping
+    over messages in Python. Values are parsed with NumPy's vectorized conversions
+    from byte strings.
+
+    Besides the fields in ``schema``, the dict contains ``stream`` (stream names),
+    ``id`` (message ids), and ``ts`` and ``seq`` (parts of the ids as ``int64``).
+    Deleted messages (with no data) are skipped. Requires ``numpy``.
+
+    Parameters
+    ----------
+    result: list
+        The reply, with message data not decoded yet (e.g. as read by a consumer with
+        ``lazy=True``). Stream names and ids can be ``str`` or ``bytes``.
+    schema: dict
+        A dict of ``field-name: dtype``, where ``dtype`` is anything ``numpy.dtype``
+        accepts. Messages are expected to contain all of the fields. A missing
+        value of a float field becomes NaN, of a string field an empty string. If
+        values of an integer or bool field are missing, the column is a
+        ``numpy.ma.MaskedArray`` with those values masked. Values that can't be
+        parsed raise ``ValueError`` naming the field.
+    encoding: str
+        Encoding of field names and of string values. Defaults to "UTF-8".
+    """
+    import numpy as np
+
+    streams, ids, rows = [], [], []
+    for stream, messages in result:
+        for _id, data in messages:
+            if data is None:
+                continue
+            streams.append(stream)
+            ids.append(_id)
+            rows.append(data)
+
+    ids = np.array(ids, dtype="S" if ids and isinstance(ids[0], bytes) else "U")
+    if len(ids) > 0:
+        parts = np.char.partition(ids, b"-" if ids.dtype.kind == "S" else "-")
+        ts, seq = parts[:, 0].astype(np.int64), parts[:, 2].astype(np.int64)
+    else:
+        ts, seq = np.zeros(0, np.int64), np.zeros(0, np.int64)
+    columns = {
+        "stream": _strings(np, streams, encoding),
+        "id": ids,
+        "ts": ts,
+        "seq": seq,
+    }
+
+    str_keys = len(rows) > 0 and not isinstance(next(iter(rows[0]), b""), bytes)
+    for field, dtype in schema.items():
+        dtype = np.dtype(dtype)
+        key = field if str_keys else field.encode(encoding)
+        missing = ""
+        if dtype.kind in "fc":
+            missing = "nan"
+        elif dtype.kind in "iub":
+            missing = "0"  # masked below
+        if not str_keys:
+            missing = missing.encode(encoding)
+        values = [data.get(key, missing) for data in rows]
+        try:
+            column = _parse(np, values, dtype, encoding)
+        except ValueError as e:
+            raise ValueError(f"Can't parse field {field!r} as {dtype}: {e}") from e
+        if dtype.kind in "iub":
+            mask = np.array([key not in data for data in rows], dtype=bool)
+            if mask.any():
+                column = np.ma.masked_array(column, mask=mask)
+        columns[field] = column
+    return columns
+
+
+def _strings(np, values, encoding):
+    if values and isinstance(values[0], bytes):
+        return np.char.decode(np.array(values, dtype="S"), encoding)
+    return np.array(values, dtype="U")
+
+
+def _parse(np, values, dtype, encoding):
+    if dtype.kind == "O":
+        return np.array(values, dtype=object)
+    raw = np.array(
+        values, dtype="S" if values and isinstance(values[0], bytes) else "U"
+    )
+    if dtype.kind == "U":
+        return np.char.decode(raw, encoding) if raw.dtype.kind == "S" else raw
+    if dtype.kind == "S":
+        return np.char.encode(raw, encoding) if raw.dtype.kind == "U" else raw
+    if dtype.kind == "b":
+        return raw.astype(np.int64).astype(bool)
+    return raw.astype(dtype)
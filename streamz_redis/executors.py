@@ -0,0 +1,129 @@
+from collections import deque
+from concurrent.futures import Executor, Future
+from threading import Condition, Thread, current_thread
+
+
+class ReaderExecutor(Executor):
+    """Thread pool for sources that do blocking reads.
+
+    A blocking ``XREAD``/``BLPOP`` holds a worker for as long as it waits, so a pool
+    with a fixed size is starved once there are more readers than workers. This pool
+    is sized from the number of registered readers: every source using it calls
+    ``.register()`` when it's started and ``.unregister()`` when it's stopped, and
+    gets a worker of its own, plus ``spare`` workers are kept for short calls like
+    ``XACK`` or ``XCLAIM``. When the pool shrinks, workers above the new size exit
+    once they're idle.
+
+    The same instance can be passed to any number of sources to share threads between
+    them. By default each source creates a pool of its own, which is shut down when
+    the source is destroyed.
+
+    Threads are daemonic, so a reader blocked on Redis doesn't keep the interpreter
+    from exiting.
+
+    Parameters
+    ----------
+    spare: int
+        Number of workers on top of one worker per registered reader. Defaults to 1.
+    thread_name_prefix: str
+        Prefix of worker thread names. Defaults to "streamz-redis".
+    """
+
+    def __init__(self, spare: int = 1, thread_name_prefix: str = "streamz-redis"):
+        self._spare = spare
+        self._prefix = thread_name_prefix
+        self._readers = 0
+        self._active = 0
+        self._idle = 0
+        self._queue = deque()
+        self._threads = set()
+        self._cond = Condition()
+        self._shutdown = False
+
+    @property
+    def _max_workers(self) -> int:
+        return max(self._readers + self._spare, 1)
+
+    def register(self):
+        """Add a worker for one more blocking reader."""
+        with self._cond:
+            self._readers += 1
+
+    def unregister(self):
+        """Remove the worker added by ``.register()``."""
+        with self._cond:
+            self._readers = max(self._readers - 1, 0)
+            self._cond.notify_all()  # let idle workers above the new size exit
+
+    def submit(self, fn, *args, **kwargs):
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            future = Future()
+            self._queue.append((future, fn, args, kwargs))
+            if len(self._queue) > self._idle and len(self._threads) < self._max_workers:
+                thread = Thread(
+                    target=self._work,
+                    name=f"{self._prefix}_{len(self._threads)}",
+                    daemon=True,
+                )
+                self._threads.add(thread)
+                thread.start()
+            else:
+                self._cond.notify()
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                while self._queue:
+                    self._queue.popleft()[0].cancel()
+            threads = list(self._threads)
+            self._cond.notify_all()
+        if wait:
+            for thread in threads:
+                thread.join()
+
+    def _work(self):
+        while True:
+            with self._cond:
+                self._idle += 1
+                while (
+                    len(self._queue) == 0
+                    and not self._shutdown
+                    and len(self._threads) <= self._max_workers
+                ):
+                    self._cond.wait()
+                self._idle -= 1
+                if len(self._queue) == 0:  # shut down, or above the pool size
+                    self._threads.discard(current_thread())
+                    return
+                future, fn, args, kwargs = self._queue.popleft()
+                self._active += 1
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        result = fn(*args, **kwargs)
+                    except BaseException as e:
+                        future.set_exception(e)
+                    else:
+                        future.set_result(result)
+            finally:
+                with self._cond:
+                    self._active -= 1
+
+    @property
+    def stats(self) -> dict:
+        """Pool usage: number of registered ``readers``, ``max_workers``, started
+        ``threads``, ``active`` calls and ``queued`` calls waiting for a worker.
+        A non-zero ``queued`` means the pool is saturated.
+        """
+        with self._cond:
+            return {
+                "readers": self._readers,
+                "max_workers": self._max_workers,
+                "threads": len(self._threads),
+                "active": self._active,
+                "queued": len(self._queue),
+            }
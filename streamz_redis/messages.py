@@ -0,0 +1,165 @@
+from typing import NamedTuple, Union
+
+
+class StreamID(NamedTuple):
+    """A parsed stream message id: a pair of ints, the millisecond timestamp and the
+    sequence number. Compares in the same order as Redis does, unlike id strings,
+    where ``"9-0"`` sorts after ``"10-0"``. ``str()`` formats it back to an id.
+
+    Parameters
+    ----------
+    ms: int
+        Millisecond timestamp.
+    seq: int
+        Sequence number. Defaults to 0.
+    """
+
+    ms: int
+    seq: int = 0
+
+    @classmethod
+    def parse(cls, value: Union[str, bytes, "StreamID"]) -> "StreamID":
+        """Parse an id like ``"1600000000000-3"``. An id without the sequence part
+        (e.g. ``"0"``) has sequence 0. Special ids like ``"$"`` or ``">"`` can't be
+        parsed and raise ``ValueError``.
+        """
+        if isinstance(value, StreamID):
+            return value
+        if isinstance(value, int):
+            return cls(value, 0)
+        if isinstance(value, bytes):
+            value = value.decode()
+        ms, _, seq = value.partition("-")
+        return cls(int(ms), int(seq or 0))
+
+    def next(self) -> "StreamID":
+        """The smallest id after this one."""
+        return StreamID(self.ms, self.seq + 1)
+
+    def __str__(self) -> str:
+        return f"{self.ms}-{self.seq}"
+
+
+class StreamMessage:
+    """A message read from a Redis stream that keeps its data as received and
+    decodes fields on first access.
+
+    Unpacks like the ``(stream-name, message-id, message-data)`` tuples emitted by
+    default, compares and hashes like them, and supports indexing with ``0``, ``1``
+    and ``2``, so code written for tuples keeps working. Unpacking or ``message[2]``
+    decodes the whole message, use ``.get()`` or ``message["field"]`` to decode only
+    the fields you need, or ``.raw`` to forward the payload without decoding it.
+
+    Parameters
+    ----------
+    stream: str
+        Stream name.
+    id: str
+        Message id.
+    raw: dict
+        Message data as returned by the client, usually ``bytes: bytes``. Already
+        decoded keys and values are left as is.
+    encoding: str
+        Encoding to decode the data with. Defaults to "UTF-8".
+    """
+
+    __slots__ = ("stream", "id", "raw", "encoding", "_data", "_complete")
+
+    def __init__(self, stream: str, id: str, raw: dict, encoding: str = "UTF-8"):
+        self.stream = stream
+        self.id = id
+        self.raw = raw
+        self.encoding = encoding
+        self._data = None
+        self._complete = False
+
+    @property
+    def sid(self) -> StreamID:
+        """Parsed message id."""
+        return StreamID.parse(self.id)
+
+    @property
+    def ts(self) -> int:
+        """Millisecond timestamp part of the message id."""
+        return self.sid.ms
+
+    @property
+    def seq(self) -> int:
+        """Sequence number part of the message id."""
+        return self.sid.seq
+
+    @property
+    def data(self) -> dict:
+        """The whole message data, decoded."""
+        if not self._complete:
+            if self.raw is None:
+                self._data = None
+            else:
+                self._data = {
+                    self._decode(k): self._decode(v) for k, v in self.raw.items()
+                }
+            self._complete = True
+        return self._data
+
+    def get(self, field: str, default=None):
+        """Decoded value of ``field``, or ``default`` if there's no such field. Only
+        this field is decoded.
+        """
+        try:
+            return self[field]
+        except KeyError:
+            return default
+
+    def _decode(self, x):
+        if isinstance(x, bytes):
+            return x.decode(self.encoding)
+        return x
+
+    def _field(self, field: str):
+        if self._complete:
+            if self._data is None:
+                raise KeyError(field)
+            return self._data[field]
+        if self._data is None:
+            self._data = {}
+        elif field in self._data:
+            return self._data[field]
+        if self.raw is None:
+            raise KeyError(field)
+        key = field.encode(self.encoding)
+        value = self.raw[key] if key in self.raw else self.raw[field]
+        value = self._data[field] = self._decode(value)
+        return value
+
+    def _astuple(self) -> tuple:
+        return (self.stream, self.id, self.data)
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._field(key)
+        return self._astuple()[key]
+
+    def __contains__(self, field: str) -> bool:
+        if self.raw is None:
+            return False
+        return field.encode(self.encoding) in self.raw or field in self.raw
+
+    def __iter__(self):
+        return iter(self._astuple())
+
+    def __len__(self) -> int:
+        return 3
+
+    def __eq__(self, other):
+        if isinstance(other, StreamMessage):
+            other = other._astuple()
+        if isinstance(other, tuple):
+            return self._astuple() == other
+        return NotImplemented
+
+    def __hash__(self):
+        # equal to the tuple, so hashed like it: only deleted messages are hashable
+        return hash(self._astuple())
+
+    def __repr__(self) -> str:
+        return f"StreamMessage({self.stream!r}, {self.id!r}, {self.raw!r})"
@@ -0,0 +1,171 @@
+import os
+import time
+from threading import Lock
+from weakref import WeakSet
+
+from redis import BlockingConnectionPool, ConnectionPool, StrictRedis
+
+_lock = Lock()
+_shared = {}
+_dedicated = {}
+_async = {}
+_names = {}
+
+
+def _reset_lock():
+    # a thread may hold the lock while another one forks a worker, the copy of the
+    # lock in the child would stay locked forever
+    global _lock
+    _lock = Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_lock)
+
+
+class CountingConnectionPool(BlockingConnectionPool):
+    """``BlockingConnectionPool`` that keeps track of how often and for how long
+    callers had to wait for a free connection.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def get_connection(self, *args, **kwargs):
+        if self.pool.empty():
+            start = time.monotonic()
+            try:
+                return super().get_connection(*args, **kwargs)
+            finally:
+                self.waits += 1
+                self.wait_time += time.monotonic() - start
+        return super().get_connection(*args, **kwargs)
+
+    @property
+    def in_use(self) -> int:
+        idle = sum(1 for c in list(self.pool.queue) if c is not None)
+        return len(self._connections) - idle
+
+
+def _normalize(client_params: dict):
+    """Resolve ``client_params`` the way ``redis-py`` does, so that e.g. ``{}`` and
+    ``{"host": "localhost"}`` end up with the same pool.
+    """
+    pool = StrictRedis(**client_params or {}).connection_pool
+    kwargs = pool.connection_kwargs
+    key = (
+        pool.connection_class,
+        tuple(sorted((k, repr(v)) for k, v in kwargs.items())),
+    )
+    with _lock:
+        if key not in _names:
+            _names[key] = _describe(kwargs)
+    return key, pool.connection_class, kwargs
+
+
+def _describe(kwargs) -> str:
+    if "path" in kwargs:
+        return f"{kwargs['path']}/{kwargs.get('db', 0)}"
+    return f"{kwargs.get('host')}:{kwargs.get('port')}/{kwargs.get('db', 0)}"
+
+
+def get_pool(
+    client_params: dict = None, max_connections: int = 50, timeout: int = 20
+) -> CountingConnectionPool:
+    """Get the shared connection pool for ``client_params``, creating it if needed.
+
+    Nodes with equal ``client_params`` share one bounded pool for short commands
+    (writes, ``XACK``, ``XCLAIM``), instead of opening a pool per node.
+
+    Parameters
+    ----------
+    client_params: dict
+        Parameters of ``redis-py`` client. Defaults to ``None``.
+    max_connections: int
+        Maximum number of connections in the pool. Only used when the pool is
+        created. Defaults to 50.
+    timeout: int
+        Number of seconds to wait for a free connection before raising
+        ``ConnectionError``. Only used when the pool is created. Defaults to 20.
+    """
+    key, connection_class, kwargs = _normalize(client_params)
+    with _lock:
+        if key not in _shared:
+            _shared[key] = CountingConnectionPool(
+                connection_class=connection_class,
+                max_connections=max_connections,
+                timeout=timeout,
+                **kwargs,
+            )
+        return _shared[key]
+
+
+def get_client(client_params: dict = None) -> StrictRedis:
+    """Get a client that uses the shared pool for ``client_params``."""
+    return StrictRedis(connection_pool=get_pool(client_params))
+
+
+def get_blocking_client(client_params: dict = None) -> StrictRedis:
+    """Get a client with a dedicated connection pool, meant for blocking commands. A
+    reader waiting for data never holds a connection from the shared pool.
+    """
+    key, connection_class, kwargs = _normalize(client_params)
+    pool = ConnectionPool(connection_class=connection_class, **kwargs)
+    with _lock:
+        _dedicated.setdefault(key, WeakSet()).add(pool)
+    return StrictRedis(connection_pool=pool)
+
+
+def get_async_client(client_params: dict = None):
+    """Get a ``redis.asyncio`` client with a dedicated connection pool, for sources
+    that await blocking reads on the event loop. Its connections belong to the loop
+    they're opened on, so it can't share a pool with other loops. Close it with
+    ``aclose()`` when done. Requires ``redis>=4.2``.
+    """
+    from redis.asyncio import StrictRedis as AsyncStrictRedis
+
+    key, _, _ = _normalize(client_params)
+    client = AsyncStrictRedis(**client_params or {})
+    with _lock:
+        _async.setdefault(key, WeakSet()).add(client.connection_pool)
+    return client
+
+
+def pool_stats() -> dict:
+    """Connection usage per Redis server, keyed by ``host:port/db``.
+
+    For each server, returns the number of connections ``created`` and ``in_use`` in
+    the shared pool, how many times callers had to wait for a connection (``waits``)
+    and for how long in total (``wait_time``, seconds), and the number of connections
+    held by blocking readers (``dedicated``), including open ``redis.asyncio``
+    connections.
+    """
+    stats = {}
+    with _lock:
+        for key in set(_shared) | set(_dedicated) | set(_async):
+            s = stats.setdefault(
+                _names[key],
+                {
+                    "created": 0,
+                    "in_use": 0,
+                    "waits": 0,
+                    "wait_time": 0.0,
+                    "dedicated": 0,
+                },
+            )
+            shared = _shared.get(key)
+            if shared is not None:
+                s["created"] += len(shared._connections)
+                s["in_use"] += shared.in_use
+                s["waits"] += shared.waits
+                s["wait_time"] += shared.wait_time
+            for pool in list(_dedicated.get(key, ())):
+                s["dedicated"] += pool._created_connections
+            for pool in list(_async.get(key, ())):
+                connections = pool._available_connections + list(
+                    pool._in_use_connections
+                )
+                s["dedicated"] += sum(1 for c in connections if c.is_connected)
+    return stats
@@ -1,12 +1,225 @@
+import asyncio
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from threading import Lock
+
 from streamz import Sink
+from tornado.ioloop import PeriodicCallback
 
 from streamz_redis.base import RedisNode
 
+logger = logging.getLogger(__name__)
+
+
+class RedisSink(RedisNode, Sink):
+    """Base class for Redis sinks.
+
+    By default every element is written with a separate command. If ``batch_size`` or
+    ``flush_interval`` is set, elements are buffered and written in a single pipeline
+    when the buffer is full, when the interval passes, and when the sink is stopped or
+    destroyed. Sinks are kept alive by ``streamz``, so call ``.stop()`` or
+    ``.flush()`` to write what's left in the buffer before exiting. If a pipeline
+    fails, its elements are put back at the front of the buffer and written with the
+    next flush.
+
+    If ``max_inflight`` or ``executor`` is set, writes are sent to an executor instead
+    of blocking the caller (and the event loop). ``update`` returns a future once
+    ``max_inflight`` writes are pending, so the upstream waits for Redis to catch up.
+    If a write fails in the executor, the error is raised by the next ``update``,
+    ``flush`` or ``stop``.
+
+    Buffered and asynchronous writes hold on to upstream metadata references until the
+    write succeeds, so messages from ``from_redis_consumer_group`` are acknowledged
+    only after they are written. References are released on the sink's event loop,
+    never on executor threads. If a write fails, its references aren't released and
+    the messages stay pending, to be replayed, and the error is raised.
+
+    Parameters
+    ----------
+    batch_size: int
+        Number of elements to buffer before writing them in one pipeline. Defaults to
+        ``None`` (no size limit on the buffer if ``flush_interval`` is set, no
+        buffering otherwise).
+    flush_interval: int or float
+        Number of seconds after which buffered elements are written, regardless of the
+        buffer size. Defaults to ``None``.
+    max_inflight: int
+        Maximum number of writes (single commands or pipelines) that can be pending in
+        the executor before backpressure is applied. Defaults to ``None`` (synchronous
+        writes, unless ``executor`` is set).
+    executor: concurrent.futures.Executor
+        Executor to run writes in. Defaults to a dedicated single-thread executor,
+        which keeps the writes in order.
+    """
+
+    def __init__(
+        self,
+        upstream,
+        batch_size=None,
+        flush_interval=None,
+        max_inflight=None,
+        executor=None,
+        **kwargs,
+    ):
+        if flush_interval is not None or max_inflight is not None or executor:
+            kwargs["ensure_io_loop"] = True
+        super().__init__(upstream, **kwargs)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._buffer = []
+        self._buffer_metadata = []
+        self._lock = Lock()
+        self._flusher = None
+        if flush_interval is not None:
+            self._flusher = PeriodicCallback(self.flush, flush_interval * 1000)
+            self.loop.add_callback(self._flusher.start)
+
+        self._max_inflight = max_inflight
+        self._inflight = deque()
+        self._error = None
+        self._own_executor = executor is None and max_inflight is not None
+        if self._own_executor:
+            executor = ThreadPoolExecutor(1, thread_name_prefix=type(self).__name__)
+        self._executor = executor
+
+    @property
+    def _buffered(self):
+        return self._batch_size is not None or self._flush_interval is not None
+
+    def _write(self, client, x):
+        """Write a single element using ``client``, which is either a Redis client or a
+        pipeline.
+        """
+        raise NotImplementedError
+
+    def _write_batch(self, client, items):
+        """Write a number of elements using ``client``. By default, calls ``_write``
+        for each of them.
+        """
+        for x in items:
+            self._write(client, x)
+
+    def _execute(self, items, metadata):
+        pipe = self._redis.pipeline(transaction=False)
+        self._write_batch(pipe, items)
+        try:
+            pipe.execute()
+        except Exception:
+            with self._lock:
+                self._buffer[:0] = items
+                self._buffer_metadata[:0] = metadata
+            raise
+
+    def _run(self, fn, args, metadata):
+        fn(*args)
+        if not metadata:
+            return
+        if self._executor is not None:
+            self.loop.add_callback(self._release_refs, metadata)
+        else:
+            self._release_refs(metadata)
+
+    def _submit(self, fn, *args, metadata=None):
+        """Run a write, then release ``metadata`` references. In asynchronous mode,
+        returns a future when the number of pending writes reaches ``max_inflight``,
+        otherwise returns ``None``.
+        """
+        if self._executor is None:
+            self._run(fn, args, metadata)
+            return None
+
+        future = self._executor.submit(self._run, fn, args, metadata)
+        with self._lock:
+            self._inflight.append(future)
+        future.add_done_callback(self._done)
+        with self._lock:
+            if self._max_inflight is None or len(self._inflight) < self._max_inflight:
+                return None
+            oldest = self._inflight[0]
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            oldest.result()  # no loop to wait on, block the caller instead
+            return None
+        return asyncio.wrap_future(oldest)
+
+    def _done(self, future):
+        with self._lock:
+            try:
+                self._inflight.remove(future)
+            except ValueError:
+                pass
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to write to Redis", exc_info=future.exception())
+            with self._lock:
+                self._error = future.exception()
+
+    def _raise_failed(self):
+        """Raise the error of a write that failed in the executor since the last
+        call.
+        """
+        with self._lock:
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
 
-class sink_to_redis_list(RedisNode, Sink):
+    def update(self, x, who=None, metadata=None):
+        if not self._buffered and self._executor is None:
+            return self._write(self._redis, x)
+        metadata = metadata or []
+        self._retain_refs(metadata)
+        if not self._buffered:
+            result = self._submit(self._write, self._redis, x, metadata=metadata)
+            self._raise_failed()
+            return result
+        with self._lock:
+            self._buffer.append(x)
+            self._buffer_metadata.extend(metadata)
+            size = len(self._buffer)
+        if self._batch_size is not None and size >= self._batch_size:
+            return self.flush()
+        self._raise_failed()
+
+    def flush(self):
+        """Write all buffered elements in a single pipeline."""
+        result = self._flush()
+        self._raise_failed()
+        return result
+
+    def _flush(self):
+        with self._lock:
+            items, self._buffer = self._buffer, []
+            metadata, self._buffer_metadata = self._buffer_metadata, []
+        if not items:
+            return
+        return self._submit(self._execute, items, metadata, metadata=metadata)
+
+    def stop(self):
+        """Stop periodic flushing, write the remaining buffered elements and wait for
+        all pending writes.
+        """
+        if self._flusher is not None:
+            self._flusher.stop()
+        self._flush()
+        with self._lock:
+            pending = list(self._inflight)
+        wait(pending)
+        self._raise_failed()
+
+    def destroy(self):
+        self.stop()
+        if self._own_executor:
+            self._executor.shutdown()
+        super().destroy()
+
+
+class sink_to_redis_list(RedisSink):
     """Push items to a Redis list."""
 
-    def __init__(self, upstream, key: str, right=True, **kwargs):
+    def __init__(
+        self, upstream, key: str, right=True, unpack=False, max_args=1000, **kwargs
+    ):
         """
         Parameters
         ----------
@@ -15,19 +228,46 @@ class sink_to_redis_list(RedisNode, Sink):
         right: bool
             Defaults to ``True``. Push items to the tail end of the list (use ``RPUSH``
             command). Otherwise, push to the head (use ``LPUSH``).
+        unpack: bool
+            If ``True``, lists and tuples received from upstream (e.g. from
+            ``partition``) are pushed as separate items with a single variadic
+            ``RPUSH``/``LPUSH``. Defaults to ``False``.
+        max_args: int
+            Maximum number of items pushed with one command. Longer sequences are split
+            into several commands. Defaults to 1000.
+        batch_size: int
+            Buffer this many items and push them with one variadic command. Defaults
+            to ``None`` (no buffering).
+        flush_interval: int or float
+            Write buffered items at least every this many seconds. Defaults to
+            ``None``.
         """
         super().__init__(upstream, **kwargs)
         self._key = key
         self._right = right
+        self._unpack = unpack
+        self._max_args = max_args
 
-    def update(self, x, who=None, metadata=None):
-        if self._right:
-            self._redis.rpush(self._key, x)
-        else:
-            self._redis.lpush(self._key, x)
+    def _items(self, x):
+        if self._unpack and isinstance(x, (list, tuple)):
+            return x
+        return (x,)
 
+    def _push(self, client, items):
+        push = client.rpush if self._right else client.lpush
+        for i in range(0, len(items), self._max_args):
+            push(self._key, *items[i : i + self._max_args])
 
-class sink_to_redis_stream(RedisNode, Sink):
+    def _write(self, client, x):
+        items = self._items(x)
+        if len(items) > 0:
+            self._push(client, items)
+
+    def _write_batch(self, client, items):
+        self._push(client, [y for x in items for y in self._items(x)])
+
+
+class sink_to_redis_stream(RedisSink):
     """Write messages to a Redis stream."""
 
     def __init__(self, upstream, key: str, maxlen=None, approximate=True, **kwargs):
@@ -38,13 +278,20 @@ class sink_to_redis_stream(RedisNode, Sink):
             Stream name.
         maxlen: int
             Defaults to ``None``. Don't allow the stream to be longer than this size.
+        approximate: bool
+            Use approximate trimming (``MAXLEN ~``) when ``maxlen`` is set. Defaults to
+            ``True``.
+        batch_size: int
+            Buffer this many messages and write them with ``XADD`` in one pipeline.
+            Defaults to ``None`` (no buffering).
+        flush_interval: int or float
+            Write buffered messages at least every this many seconds. Defaults to
+            ``None``.
         """
         super().__init__(upstream, **kwargs)
         self._key = key
         self._maxlen = maxlen
         self._approximate = approximate
 
-    def update(self, x, who=None, metadata=None):
-        self._redis.xadd(
-            self._key, x, maxlen=self._maxlen, approximate=self._approximate
-        )
+    def _write(self, client, x):
+        client.xadd(self._key, x, maxlen=self._maxlen, approximate=self._approximate)
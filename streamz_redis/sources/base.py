@@ -1,11 +1,28 @@
+import time
+
 from streamz import Source
 from streamz.core import RefCounter
 from streamz_redis.base import RedisNode
+from streamz_redis.columns import to_columns
+from streamz_redis.executors import ReaderExecutor
+from streamz_redis.messages import StreamMessage
+from streamz_redis.sources.consumers import AdaptiveCount
 from tornado import gen
 
 
-def create_metadata(cb):
-    return [{"ref": RefCounter(cb=cb)}]
+def create_metadata(cb, loop=None):
+    return [{"ref": RefCounter(cb=cb, loop=loop)}]
+
+
+def check_lazy(lazy: bool, convert: bool, fields):
+    """Reject options that ``lazy`` can't honour: ``StreamMessage`` decodes data on
+    access, so it can't leave it as ``bytes`` (``convert=False``) and decodes only the
+    fields that are accessed anyway (``fields``).
+    """
+    if lazy and not convert:
+        raise ValueError("lazy can't be used with convert=False")
+    if lazy and fields is not None:
+        raise ValueError("lazy can't be used with fields")
 
 
 class RedisSource(Source, RedisNode):
@@ -16,21 +33,117 @@ class RedisSource(Source, RedisNode):
 
     client_params: dict
         Will be passed to ``redis-py`` client instance. Defaults to None.
+    engine: str
+        How blocking reads are performed. ``"thread"`` (the default) runs the
+        synchronous client in a thread pool. ``"asyncio"`` awaits a ``redis.asyncio``
+        client directly on the event loop, so any number of blocked readers share the
+        loop without occupying threads. Requires ``redis>=4.2``.
+    executor: concurrent.futures.Executor
+        Executor for blocking calls made by this source. Pass the same
+        ``ReaderExecutor`` to several sources to share a pool that is sized from the
+        number of sources using it. Defaults to ``None`` (a dedicated
+        ``ReaderExecutor`` for this source, shut down by ``.destroy()``).
     """
 
-    def __init__(self, **kwargs):
+    engines = ("thread", "asyncio")
+    _lazy = False
+    _schema = None
+    _encoding = "UTF-8"
+
+    def __init__(self, engine: str = "thread", executor=None, **kwargs):
+        if engine not in self.engines:
+            raise ValueError(f"engine must be one of {self.engines}")
+        self._engine = engine
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ReaderExecutor(thread_name_prefix=type(self).__name__)
+        self._executor = executor
+        self._registered = 0
         super().__init__(ensure_io_loop=True, **kwargs)
 
+    @property
+    def executor_stats(self) -> dict:
+        """Usage of this source's executor, see ``ReaderExecutor.stats``. Empty if
+        the executor isn't a ``ReaderExecutor``.
+        """
+        if isinstance(self._executor, ReaderExecutor):
+            return self._executor.stats
+        return {}
+
+    def _reader_count(self) -> int:
+        """Number of blocking reads this source runs at the same time."""
+        return 1
+
+    def _register_readers(self):
+        """Reserve workers of a ``ReaderExecutor`` for this source's readers."""
+        if isinstance(self._executor, ReaderExecutor) and not self._registered:
+            self._registered = self._reader_count()
+            for _ in range(self._registered):
+                self._executor.register()
+
+    def _unregister_readers(self):
+        """Give back the workers reserved by ``_register_readers``."""
+        registered, self._registered = self._registered, 0
+        for _ in range(registered):
+            self._executor.unregister()
+
     def start(self):
+        self._register_readers()
         self.stopped = False
-        self.loop.add_callback(self._run)
+        self.loop.add_callback(self._main)
+
+    def stop(self):
+        self._unregister_readers()
+        super().stop()
+
+    def destroy(self, streams=None):
+        self.stop()
+        if self._own_executor:
+            self._executor.shutdown(wait=False)
+        super().destroy(streams)
+
+    @gen.coroutine
+    def _main(self):
+        """Run the source until it's stopped, then close the ``redis.asyncio``
+        client, once no read is waiting on it.
+        """
+        try:
+            yield self._run()
+        finally:
+            client, self._async_client = self._async_client, None
+            if client is not None:
+                close = getattr(client, "aclose", None) or client.close
+                yield close()
 
     def _run_in_executor(self, fn, *args):
         """Shorthand for running something in a thread."""
-        return self.loop.run_in_executor(None, fn, *args)
+        return self.loop.run_in_executor(self._executor, fn, *args)
+
+    def _read(self, fn, async_fn, *args):
+        """Perform a blocking read with the selected engine: run ``fn`` in a thread or
+        await ``async_fn`` on the loop.
+        """
+        if self._engine == "asyncio":
+            return async_fn(*args)
+        return self._run_in_executor(fn, *args)
+
+    def _message(self, stream, _id, data):
+        """A tuple to emit, or a ``StreamMessage`` if the source is lazy."""
+        if self._lazy:
+            return StreamMessage(stream, _id, data, self._encoding)
+        return (stream, _id, data)
 
     @gen.coroutine
-    def _emit_streams_response(self, result, ack=None):
+    def _emit_and_adapt(self, result, count, ack=None, batches=False):
+        """Emit a response, reporting the time it took to an ``AdaptiveCount``."""
+        start = time.monotonic()
+        yield self._emit_streams_response(result, ack=ack, batches=batches)
+        if isinstance(count, AdaptiveCount):
+            n = max((len(messages) for _, messages in result), default=0)
+            count.processed(n, time.monotonic() - start)
+
+    @gen.coroutine
+    def _emit_streams_response(self, result, ack=None, batches=False):
         """Emits individual messages from a batch received from the client.
 
         Client response looks like this:
@@ -48,17 +161,49 @@ class RedisSource(Source, RedisNode):
 
         The events will be emitted as a 3-tuple:
         (stream-name, message-id, message-data)
+        or as a ``StreamMessage``, which unpacks the same way, if the source is lazy.
 
         The events are emitted individually rather than in batches, as they are received
         from the client. This is because we don't want them to share metadata.
         If the batch gets split later on in the pipeline, messages in the batch will be
         acknowledged only when all of them are processed, which can lead to reading them
         twice in case of pipeline crash and recovery.
+
+        If ``batches`` is True, the whole response is emitted at once as a list of
+        3-tuples, sharing a single metadata reference. The ``ack`` callbacks, one per
+        stream and covering all of the stream's message ids, are called when the
+        whole batch is processed. This saves a coroutine and a reference counter per
+        message, at the cost of the trade-off above.
+
+        If the source has a schema, the whole response is emitted at once as a dict
+        of NumPy arrays (see ``to_columns()``), acknowledged the same way.
         """
+        if batches or self._schema is not None:
+            if sum(len(messages) for _, messages in result) == 0:
+                return
+            if self._schema is not None:
+                batch = to_columns(result, self._schema, self._encoding)
+            else:
+                batch = [
+                    self._message(s, _id, data)
+                    for s, messages in result
+                    for _id, data in messages
+                ]
+            m = None
+            if callable(ack):
+                callbacks = [
+                    ack(stream, *[_id for _id, _ in messages])
+                    for stream, messages in result
+                    if len(messages) > 0
+                ]
+                m = create_metadata(lambda: [cb() for cb in callbacks], loop=self.loop)
+            yield self._emit(batch, metadata=m)
+            return
+
         for stream, messages in result:
             for _id, data in messages:
                 if callable(ack):
-                    m = create_metadata(ack(stream, _id))
+                    m = create_metadata(ack(stream, _id), loop=self.loop)
                 else:
                     m = None
-                yield self._emit((stream, _id, data), metadata=m)
+                yield self._emit(self._message(stream, _id, data), metadata=m)
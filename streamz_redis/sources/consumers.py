@@ -1,7 +1,11 @@
+import zlib
+from collections import defaultdict
+from threading import Lock
 from typing import Union
 
 from redis import StrictRedis
 from redis.exceptions import ResponseError
+from streamz_redis.messages import StreamID
 
 
 def convert_bytes(data, encoding="UTF-8"):
@@ -17,14 +21,251 @@ def convert_bytes(data, encoding="UTF-8"):
     if isinstance(data, bytes):
         return data.decode(encoding)
     if isinstance(data, list):
-        return list(map(convert_bytes, data))
+        return [convert_bytes(x, encoding) for x in data]
     if isinstance(data, dict):
-        return dict(map(convert_bytes, data.items()))
+        return {
+            convert_bytes(k, encoding): convert_bytes(v, encoding)
+            for k, v in data.items()
+        }
     if isinstance(data, tuple):
-        return tuple(map(convert_bytes, data))
+        return tuple(convert_bytes(x, encoding) for x in data)
     return data
 
 
+def decode_messages(messages: list, encoding: str = "UTF-8", fields=None) -> list:
+    """Decode a list of ``(message-id, message-data)`` tuples, as returned by
+    ``XRANGE`` or ``XCLAIM``. Much faster than ``convert_bytes``, because the shape of
+    the data is known in advance.
+
+    Parameters
+    ----------
+    messages: list
+        Messages to decode. Data of deleted messages (``None``) is left as is.
+    encoding: str
+        Encoding to use when decoding bytes. Defaults to ``UTF-8``.
+    fields: iterable of str
+        Only decode values of these fields, leaving other values as ``bytes``. Field
+        names are always decoded. Defaults to ``None`` (decode all values).
+    """
+    if fields is None:
+        return [
+            (
+                _id.decode(encoding),
+                (
+                    None
+                    if data is None
+                    else {
+                        k.decode(encoding): v.decode(encoding) for k, v in data.items()
+                    }
+                ),
+            )
+            for _id, data in messages
+        ]
+    fields = {f.encode(encoding) if isinstance(f, str) else f for f in fields}
+    return [
+        (
+            _id.decode(encoding),
+            (
+                None
+                if data is None
+                else {
+                    k.decode(encoding): v.decode(encoding) if k in fields else v
+                    for k, v in data.items()
+                }
+            ),
+        )
+        for _id, data in messages
+    ]
+
+
+def decode_ids(messages: list, encoding: str = "UTF-8") -> list:
+    """Decode only the ids in a list of ``(message-id, message-data)`` tuples, leaving
+    the data as is.
+    """
+    return [(_id.decode(encoding), data) for _id, data in messages]
+
+
+def decode_streams_response(
+    res: list, encoding: str = "UTF-8", fields=None, lazy: bool = False
+) -> list:
+    """Decode a reply to ``XREAD`` or ``XREADGROUP``, see ``decode_messages()``. If
+    ``lazy`` is True, only stream names and message ids are decoded.
+    """
+    return [
+        [
+            stream.decode(encoding) if isinstance(stream, bytes) else stream,
+            (
+                decode_ids(messages, encoding)
+                if lazy
+                else decode_messages(messages, encoding, fields)
+            ),
+        ]
+        for stream, messages in res
+    ]
+
+
+class StreamReplyParser:
+    """Response callbacks that turn raw replies to ``XREAD``, ``XREADGROUP`` and
+    ``XCLAIM`` straight into their final decoded form, in one pass. They replace
+    ``redis-py``'s callbacks, which build a tuple and a dict for every entry that
+    would be decoded and rebuilt again afterwards. If ``hiredis`` is installed, the
+    raw reply itself is built by its C parser.
+
+    Parameters
+    ----------
+    encoding: str
+        Encoding to decode the replies with. Defaults to "UTF-8".
+    convert: bool
+        Decode ``bytes`` to ``str``. If False, only the structure is built. Defaults
+        to True.
+    fields: iterable of str
+        Only decode values of these fields, see ``decode_messages()``. Defaults to
+        ``None``.
+    lazy: bool
+        Only decode stream names and message ids. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        encoding: str = "UTF-8",
+        convert: bool = True,
+        fields=None,
+        lazy: bool = False,
+    ):
+        self.encoding = encoding
+        self.convert = convert
+        self.lazy = lazy
+        self.fields = None
+        if fields is not None:
+            self.fields = {f.encode(encoding) for f in fields}
+
+    def register(self, client):
+        """Set the callbacks on ``client``. They apply to all calls made with it, so
+        the client shouldn't be shared with code that expects the default replies.
+        """
+        client.set_response_callback("XREAD", self.streams)
+        client.set_response_callback("XREADGROUP", self.streams)
+        client.set_response_callback("XCLAIM", self.claimed)
+
+    def streams(self, response, **options) -> list:
+        """Parse a reply to ``XREAD`` or ``XREADGROUP``."""
+        if response is None:
+            return []
+        encoding = self.encoding
+        return [
+            [
+                stream.decode(encoding) if isinstance(stream, bytes) else stream,
+                self.messages(entries),
+            ]
+            for stream, entries in response
+        ]
+
+    def claimed(self, response, **options) -> list:
+        """Parse a reply to ``XCLAIM``."""
+        if options.get("parse_justid", False):
+            return response
+        return self.messages(response)
+
+    def messages(self, entries) -> list:
+        """Parse a list of ``[message-id, [field, value, ...]]`` entries."""
+        if not self.convert:
+            return [(_id, _pairs(pairs)) for _id, pairs in entries]
+        encoding = self.encoding
+        if self.lazy:
+            return [(_id.decode(encoding), _pairs(pairs)) for _id, pairs in entries]
+        fields = self.fields
+        result = []
+        for _id, pairs in entries:
+            if pairs is None:
+                data = None
+            else:
+                it = iter(pairs)
+                if fields is None:
+                    data = {
+                        k.decode(encoding): v.decode(encoding) for k, v in zip(it, it)
+                    }
+                else:
+                    data = {
+                        k.decode(encoding): v.decode(encoding) if k in fields else v
+                        for k, v in zip(it, it)
+                    }
+            result.append((_id.decode(encoding), data))
+        return result
+
+
+def _pairs(pairs):
+    if pairs is None:
+        return None
+    it = iter(pairs)
+    return dict(zip(it, it))
+
+
+def decodes_responses(client) -> bool:
+    """Whether ``client`` is set up to decode responses at the connection level
+    (``decode_responses=True``), in which case there's nothing left to convert.
+    """
+    pool = getattr(client, "connection_pool", None)
+    if pool is None:
+        return False
+    return bool(pool.connection_kwargs.get("decode_responses", False))
+
+
+class AdaptiveCount:
+    """``COUNT`` for stream reads that adapts to the backlog and to how long it takes
+    to process a reply.
+
+    Starts at ``min_count``. ``COUNT`` applies to each stream separately, so a reply
+    is measured by its largest stream. A reply that is full (as many messages as
+    requested from some stream) means there's a backlog, so the count doubles, up to
+    ``max_count``. A reply that's less than half full means the consumer has caught
+    up, so the count shrinks back towards the reply size, down to ``min_count``. If
+    processing a reply downstream takes longer than ``target_latency``, the count is
+    scaled down proportionally, which keeps replies small enough for low-latency
+    processing.
+
+    Parameters
+    ----------
+    min_count: int
+        Lower bound. Defaults to 1.
+    max_count: int
+        Upper bound. Defaults to 1000.
+    target_latency: float
+        Desired number of seconds to process one reply downstream. Defaults to 0.1.
+    """
+
+    def __init__(
+        self, min_count: int = 1, max_count: int = 1000, target_latency: float = 0.1
+    ):
+        if not 0 < min_count <= max_count:
+            raise ValueError("must be 0 < min_count <= max_count")
+        self.min_count = min_count
+        self.max_count = max_count
+        self.target_latency = target_latency
+        self.value = min_count
+
+    def __repr__(self):
+        return f"<AdaptiveCount value={self.value}>"
+
+    def _clip(self, value):
+        return max(self.min_count, min(self.max_count, int(value)))
+
+    def received(self, n: int):
+        """Adjust the count for the size of the last reply, i.e. the number of
+        messages read from its largest stream.
+        """
+        if n >= self.value:
+            self.value = self._clip(self.value * 2)
+        elif n < self.value // 2:
+            self.value = self._clip(max(n, self.value // 2))
+
+    def processed(self, n: int, elapsed: float):
+        """Adjust the count for the time it took to process a reply of ``n``
+        messages from its largest stream.
+        """
+        if n > 0 and elapsed > self.target_latency:
+            self.value = self._clip(min(self.value, n * self.target_latency / elapsed))
+
+
 class Consumer:
     """Helper class to consume messages from a number of streams. Basically a stateful
     wrapper around Redis ``XREAD`` command. Keeps track of received messages during its
@@ -38,9 +279,10 @@ class Consumer:
         A dict of ``stream-name: message-id``. ``message-id`` is an id to start
         consuming the messages from. The first call to `.consume()` will use this value,
         subsequent calls will only return new messages.
-    count: int
+    count: int or AdaptiveCount
         Number of messages to read from the stream at one time. If ``None``, all
-        messages are received. Defaults to ``None``.
+        messages are received. Pass an ``AdaptiveCount`` to adjust the number between
+        reads. Defaults to ``None``.
     block: int
         Number of milliseconds to block for before returning no messages (empty list
         for each stream), if no new messages are added to the stream. Defaults to 0
@@ -50,32 +292,63 @@ class Consumer:
         that's used. Defaults to `"$"`, so will start reading only new messages. Another
         possible value is `"0"` to start reading from the beginning of the stream.
     convert: bool
-        Convert ``bytes`` in the messages to ``str``. Defaults to True.
+        Convert ``bytes`` in the messages to ``str``. Ignored if ``client`` already
+        decodes responses (``decode_responses=True``). Defaults to True.
     encoding: str
         This is the encoding that will be used to convert ``bytes`` to ``str`` if
         ``convert`` is True. Defaults to "UTF-8".
+    async_client: redis.asyncio.StrictRedis
+        ``redis.asyncio`` client instance used by ``.consume_async()``. Defaults to
+        ``None``.
+    fields: list of str
+        If ``convert`` is True, only decode values of these fields and leave other
+        values as ``bytes``. Defaults to ``None`` (decode all values).
+    lazy: bool
+        If ``convert`` is True, only decode stream names and message ids, and leave
+        message data to be decoded later, e.g. by ``StreamMessage``. Defaults to
+        False.
+    parse_replies: bool
+        Register a ``StreamReplyParser`` on ``client`` and ``async_client``, which
+        turns raw replies into their final form in one pass instead of going through
+        ``redis-py``'s callbacks and decoding afterwards. Changes the replies to
+        ``XREAD``, ``XREADGROUP`` and ``XCLAIM`` for all users of the clients, so
+        they shouldn't be shared. Defaults to False.
     """
 
     def __init__(
         self,
         client: StrictRedis,
         streams: Union[str, dict, tuple, list],
-        count: int = None,
+        count: Union[int, "AdaptiveCount"] = None,
         block: int = 0,
         default_start_id: str = "$",
         convert: bool = True,
         encoding: str = "UTF-8",
+        async_client=None,
+        fields: list = None,
+        lazy: bool = False,
+        parse_replies: bool = False,
     ):
         self.streams = self._convert_streams(streams, default_start_id)
         self.client = client
+        self.async_client = async_client
         if block is None:
             raise ValueError(
                 "block must be an int, non-blocking XREAD is not supported"
             )
         self.block = block
         self.count = count
-        self.convert = convert
+        self.convert = convert and not decodes_responses(client)
         self.encoding = encoding
+        self.fields = fields
+        self.lazy = lazy
+        self.positions = {}
+        self.parser = None
+        if parse_replies:
+            self.parser = StreamReplyParser(encoding, self.convert, fields, lazy)
+            for c in (client, async_client):
+                if c is not None:
+                    self.parser.register(c)
 
     @staticmethod
     def _convert_streams(s, default):
@@ -92,10 +365,31 @@ class Consumer:
             return convert_bytes(data, encoding=self.encoding)
         return data
 
+    def _decode_streams(self, res):
+        if self.parser is not None:
+            return res  # parsed by the client
+        if self.convert:
+            return decode_streams_response(res, self.encoding, self.fields, self.lazy)
+        return res
+
+    def _decode_claimed(self, messages):
+        if self.parser is not None:
+            return messages  # parsed by the client
+        return self._decode_messages(messages)
+
+    def _decode_messages(self, messages):
+        if self.convert and self.lazy:
+            return decode_ids(messages, self.encoding)
+        if self.convert:
+            return decode_messages(messages, self.encoding, self.fields)
+        return messages
+
     def consume(self, count: int = None, block: int = None):
         """Consume messages from streams.
 
-        Converts the ``bytes`` in the message to ``str``.
+        Converts the ``bytes`` in the message to ``str``. The position in each stream
+        is moved to the last message returned, ``.positions`` holds these positions
+        as ``StreamID``.
 
         Parameters
         ----------
@@ -104,13 +398,39 @@ class Consumer:
         block: int
             Optionally override default ``block``. Defaults to ``None``.
         """
-        _count = count or self.count
-        _block = block or self.block
-        res = self._preprocess(
-            self.client.xread(self.streams, block=_block, count=_count)
+        res = self.client.xread(**self._xread_params(count, block))
+        return self._update(res)
+
+    async def consume_async(self, count: int = None, block: int = None):
+        """Same as ``.consume()``, but awaits the reply using ``async_client``."""
+        res = await self.async_client.xread(**self._xread_params(count, block))
+        return self._update(res)
+
+    def _xread_params(self, count, block):
+        return dict(
+            streams=self.streams,
+            count=count or self._count(),
+            block=block or self.block,
         )
+
+    def _count(self):
+        if isinstance(self.count, AdaptiveCount):
+            return self.count.value
+        return self.count
+
+    def _observe(self, res):
+        if isinstance(self.count, AdaptiveCount):
+            self.count.received(max((len(messages) for _, messages in res), default=0))
+
+    def _update(self, res):
+        res = self._decode_streams(res)
+        self._observe(res)
         for stream, messages in res:
-            self.streams[stream] = max(i for (i, _) in messages)
+            if len(messages) > 0:
+                # entries come in order, the last one is the newest
+                last = messages[-1][0]
+                self.streams[stream] = last
+                self.positions[stream] = StreamID.parse(last)
         return res
 
 
@@ -135,18 +455,42 @@ class GroupConsumer(Consumer):
         in ``streams``.
     consumer_name: str
         Name of Redis consumer in the consumer group.
-    count: int
+    count: int or AdaptiveCount
         Number of messages to read from the stream at one time. If ``None``, all
-        messages are received. Defaults to ``None``.
+        messages are received. Pass an ``AdaptiveCount`` to adjust the number between
+        reads. Defaults to ``None``.
     block: int
         Number of milliseconds to block for before returning no messages (empty list
         for each stream), if no new messages are added to the stream. ``None`` is not
         allowed. Defaults to 0 (wait indefinitely).
     convert: bool
-        Convert ``bytes`` in the messages to ``str``. Defaults to True.
+        Convert ``bytes`` in the messages to ``str``. Ignored if ``client`` already
+        decodes responses (``decode_responses=True``). Defaults to True.
     encoding: str
         This is the encoding that will be used to convert ``bytes`` to ``str`` if
         ``convert`` is True. Defaults to "UTF-8".
+    async_client: redis.asyncio.StrictRedis
+        ``redis.asyncio`` client instance used by ``.consume_async()``. Defaults to
+        ``None``.
+    autoclaim: bool
+        Steal only idle messages from dead consumers with ``XPENDING`` with ``IDLE``
+        and ``XCLAIM``, a page at a time, falling back to claiming all of them at once
+        if the server doesn't support it (Redis < 6.2). Defaults to True.
+    fields: list of str
+        If ``convert`` is True, only decode values of these fields and leave other
+        values as ``bytes``. Defaults to ``None`` (decode all values).
+    lazy: bool
+        If ``convert`` is True, only decode stream names and message ids, and leave
+        message data to be decoded later, e.g. by ``StreamMessage``. Defaults to
+        False.
+    parse_replies: bool
+        Register a ``StreamReplyParser`` on the clients, see ``Consumer``. Defaults
+        to False.
+    command_client: StrictRedis
+        ``redis-py`` client instance for short commands (``XACK``, ``XCLAIM``,
+        ``XPENDING``...), e.g. one using a shared, bounded connection pool, so that
+        only ``XREADGROUP`` goes through ``client``. Defaults to ``None`` (use
+        ``client``).
     """
 
     def __init__(
@@ -155,10 +499,16 @@ class GroupConsumer(Consumer):
         streams: Union[str, dict, tuple, list],
         group_name: str,
         consumer_name: str,
-        count: int = None,
+        count: Union[int, "AdaptiveCount"] = None,
         block: int = 0,
         convert: bool = True,
         encoding: str = "UTF-8",
+        async_client=None,
+        autoclaim: bool = True,
+        fields: list = None,
+        lazy: bool = False,
+        parse_replies: bool = False,
+        command_client: StrictRedis = None,
     ):
         super().__init__(
             client=client,
@@ -167,9 +517,19 @@ class GroupConsumer(Consumer):
             block=block,
             convert=convert,
             encoding=encoding,
+            async_client=async_client,
+            fields=fields,
+            lazy=lazy,
+            parse_replies=parse_replies,
         )
+        self.commands = command_client or client
+        if self.parser is not None and self.commands is not client:
+            self.parser.register(self.commands)
         self.group = group_name
         self.name = consumer_name
+        self.use_autoclaim = autoclaim
+        self._claim_cursors = {}
+        self._partition_cursors = {}
         self.ensure_group()
 
     def ensure_group(self):
@@ -178,7 +538,7 @@ class GroupConsumer(Consumer):
         """
         for stream, _ in self.streams.items():
             try:
-                self.client.xgroup_create(stream, self.group, id="0", mkstream=True)
+                self.commands.xgroup_create(stream, self.group, id="0", mkstream=True)
             except ResponseError:
                 pass
 
@@ -191,19 +551,93 @@ class GroupConsumer(Consumer):
             Read messages from PEL (pending entry list) instead of new messages.
             Useful for initial recovery.
         """
+        res = self.client.xreadgroup(**self._xreadgroup_params(pending))
+        return self._process(res, pending)
+
+    async def read_async(self, pending=False):
+        """Same as ``.read()``, but awaits the reply using ``async_client``."""
+        res = await self.async_client.xreadgroup(**self._xreadgroup_params(pending))
+        return self._process(res, pending)
+
+    def _process(self, res, pending):
+        res = self._decode_streams(res)
+        if not pending:
+            self._observe(res)
+        return res
+
+    def _xreadgroup_params(self, pending):
         _id = "0" if pending else ">"
-        _count = None if pending else self.count
-        streams = {s: _id for s in self.streams}
-        return self._preprocess(
-            self.client.xreadgroup(
-                self.group,
-                self.name,
-                streams,
-                count=_count,
-                block=self.block,
-            )
+        return dict(
+            groupname=self.group,
+            consumername=self.name,
+            streams={s: _id for s in self.streams},
+            count=None if pending else self._count(),
+            block=self.block,
+        )
+
+    def read_pending(self, cursors: dict, count: int = 1000):
+        """Read one page of this consumer's messages from PEL (pending entry list).
+        Unlike ``.read(pending=True)``, never reads more than ``count`` messages per
+        stream, so the whole PEL doesn't have to fit into a single reply.
+
+        Parameters
+        ----------
+        cursors: dict
+            A dict of ``stream-name: message-id``. Only messages after
+            ``message-id`` are read, so start with ``"0"`` for each stream. The dict is
+            updated in place: cursors are moved to the last message read, and streams
+            that have no more pending messages are removed. Reading is done when the
+            dict is empty.
+        count: int
+            Maximum number of messages to read from each stream. Defaults to 1000.
+        """
+        res = self.client.xreadgroup(**self._pending_params(cursors, count))
+        return self._advance(cursors, count, self._decode_streams(res))
+
+    async def read_pending_async(self, cursors: dict, count: int = 1000):
+        """Same as ``.read_pending()``, but awaits the reply using ``async_client``."""
+        res = await self.async_client.xreadgroup(**self._pending_params(cursors, count))
+        return self._advance(cursors, count, self._decode_streams(res))
+
+    def _pending_params(self, cursors, count):
+        return dict(
+            groupname=self.group,
+            consumername=self.name,
+            streams=dict(cursors),
+            count=count,
         )
 
+    def _advance(self, cursors, count, res):
+        returned = set()
+        for stream, messages in res:
+            name = self._name(stream)
+            returned.add(name)
+            if len(messages) < count:
+                cursors.pop(name, None)  # last page
+            else:
+                cursors[name] = messages[-1][0]
+        for name in set(cursors) - returned:
+            del cursors[name]
+        return res
+
+    def _name(self, stream):
+        if isinstance(stream, bytes):
+            return stream.decode(self.encoding)
+        return stream
+
+    def count_pending(self, consumer: str = None) -> int:
+        """Number of messages in PEL across all streams that belong to ``consumer``,
+        this one by default.
+        """
+        consumer = consumer or self.name
+        total = 0
+        for stream in self.streams:
+            info = self._preprocess(self.commands.xpending(stream, self.group))
+            for con in info["consumers"]:
+                if self._name(con["name"]) == consumer:
+                    total += con["pending"]
+        return total
+
     def consume(self, pending=False):
         """Consume messages from streams.
 
@@ -215,14 +649,18 @@ class GroupConsumer(Consumer):
         """
         return self.read(pending)
 
+    async def consume_async(self, pending=False):
+        """Same as ``.consume()``, but awaits the reply using ``async_client``."""
+        return await self.read_async(pending)
+
     def ack(self, stream, *ids):
         """Acknowledge a number of message ids."""
-        self.client.xack(stream, self.group, *ids)
+        self.commands.xack(stream, self.group, *ids)
 
     def get_pending(self, stream, consumer, count):
         """Get a list of pending messages belonging to a consumer."""
         messages = self._preprocess(
-            self.client.xpending_range(
+            self.commands.xpending_range(
                 name=stream,
                 groupname=self.group,
                 min="-",
@@ -239,27 +677,234 @@ class GroupConsumer(Consumer):
         is useful when a consumer in the group is down for a long time (possibly
         forever) and we need to recover unacknoledged messages.
         """
-        _count = count or self.count or 1000  # have to provide a count
+        _count = count or self._count() or 1000  # have to provide a count
 
         ids = self.get_pending(stream, consumer, _count)
         if len(ids) > 0:
-            claimed = self._preprocess(
-                self.client.xclaim(
+            claimed = self._decode_claimed(
+                self.commands.xclaim(
                     name=stream,
                     groupname=self.group,
                     consumername=self.name,
-                    min_idle_time=0,
+                    min_idle_time=min_idle_time,
                     message_ids=ids,
                 )
             )
             return [[stream, claimed]]  # add stream name to mimic the usual batch
         return [[stream, []]]
 
+    def autoclaim(self, stream, min_idle_time, count=None, consumer=None):
+        """Claim one page of messages that have been pending for at least
+        ``min_idle_time`` milliseconds with ``XAUTOCLAIM`` (Redis 6.2+), regardless of
+        the consumer they belong to, live or not. To claim only the messages of a dead
+        consumer, use ``.steal_stream()``. Keeps a cursor per stream and ``consumer``
+        (a label, so that separate scans don't share a cursor), so every call
+        continues where the previous one stopped, and starts over after reaching the
+        end of PEL.
+
+        Messages that already belong to this consumer aren't returned, they are still
+        being processed. Messages deleted from the stream are acknowledged, so they
+        don't stay in PEL.
+
+        Returns a batch (with stream name) and a flag that is ``True`` if the end of
+        PEL is reached.
+        """
+        _count = count or self._count() or 1000
+        key = (stream, consumer)
+        cursor = self._claim_cursors.get(key, "0-0")
+        # in a transaction, XPENDING lists the entries XAUTOCLAIM claims, in order
+        pipe = self.commands.pipeline(transaction=True)
+        pipe.xpending_range(
+            stream,
+            self.group,
+            min=cursor,
+            max="+",
+            count=_count,
+            idle=min_idle_time,
+        )
+        pipe.xautoclaim(
+            stream,
+            self.group,
+            self.name,
+            min_idle_time,
+            start_id=cursor,
+            count=_count,
+        )
+        pending, res = pipe.execute()
+        cursor = self._name(res[0])
+        self._claim_cursors[key] = cursor
+
+        own = {
+            p["message_id"] for p in pending if self._name(p["consumer"]) == self.name
+        }
+        messages, deleted = [], []
+        for i, (_id, data) in enumerate(res[1]):
+            if _id is None:  # a deleted entry, Redis 6.2 replies with nil
+                _id = pending[i]["message_id"]
+            if data is None:
+                deleted.append(_id)
+            elif _id not in own:
+                messages.append((_id, data))
+        if len(deleted) > 0:  # Redis 7+ removes them from PEL by itself
+            self.commands.xack(stream, self.group, *deleted)
+        return [[stream, self._decode_messages(messages)]], cursor == "0-0"
+
     def steal_pending(self, consumer, min_idle_time):
         """Steal pending messages in all streams from another consumer in this
-        group.
+        group. Only messages pending for at least ``min_idle_time`` milliseconds are
+        claimed, so messages of live consumers aren't stolen.
+
+        If ``autoclaim`` is on, only ``consumer``'s messages that are idle for long
+        enough are listed, with ``XPENDING`` with ``IDLE`` (Redis 6.2+), and claimed
+        with ``XCLAIM``, a page per call. If the server doesn't support it, falls back
+        to claiming all of ``consumer``'s messages with ``XPENDING`` + ``XCLAIM``.
         """
         res = []
         for stream in self.streams:
-            res.extend(self.claim_pending(stream, consumer, min_idle_time))
+            res.extend(self.steal_stream(stream, consumer, min_idle_time))
         return res
+
+    def steal_stream(self, stream, consumer, min_idle_time, members=None):
+        """Same as ``.steal_pending()``, but for a single stream.
+
+        If ``members`` (a list of live consumers in the group, including this one) is
+        given, only this consumer's share of the messages is claimed, otherwise all
+        of them, see ``.claim_partition()``. That needs Redis 6.2+, on older servers
+        all messages are claimed with ``XPENDING`` + ``XCLAIM``.
+        """
+        if self.use_autoclaim:
+            if members is None or self.name not in members:
+                members = [self.name]
+            try:
+                return self.claim_partition(stream, consumer, min_idle_time, members)
+            except ResponseError as e:
+                if not _unsupported(e):
+                    raise
+                self.use_autoclaim = False  # Redis < 6.2
+        return self.claim_pending(stream, consumer, min_idle_time)
+
+    def claim_partition(self, stream, consumer, min_idle_time, members, count=None):
+        """Claim this consumer's share of another consumer's pending messages, so that
+        a number of live consumers can split the work without racing for the same
+        messages. A message belongs to the consumer at index ``crc32(id) % N`` in
+        the sorted list of ``N`` live ``members``. If a member dies too, pass the
+        members that are left on the next scan, and its share is split between them.
+        With this consumer as the only member, all of the messages are claimed.
+
+        Like ``.autoclaim()``, keeps a cursor per stream and consumer, and returns
+        pages until the end of PEL is reached. The call after that returns nothing and
+        resets the cursor. Requires Redis 6.2+.
+        """
+        _count = count or self._count() or 1000
+        members = sorted(members)
+        index = members.index(self.name)
+        key = (stream, consumer)
+        start = self._partition_cursors.pop(key, "-")
+        if start is None:
+            return [[stream, []]]  # the end was reached with the previous call
+
+        while True:
+            pending = self._preprocess(
+                self.commands.xpending_range(
+                    name=stream,
+                    groupname=self.group,
+                    min=start,
+                    max="+",
+                    count=_count,
+                    consumername=consumer,
+                    idle=min_idle_time,
+                )
+            )
+            ids = [
+                p["message_id"]
+                for p in pending
+                if zlib.crc32(self._id_bytes(p["message_id"])) % len(members) == index
+            ]
+            done = len(pending) < _count
+            if not done:
+                start = "(" + self._name(pending[-1]["message_id"])
+            self._partition_cursors[key] = None if done else start
+            if len(ids) > 0 or done:
+                break
+
+        if len(ids) == 0:
+            return [[stream, []]]
+        claimed = self._decode_claimed(
+            self.commands.xclaim(
+                name=stream,
+                groupname=self.group,
+                consumername=self.name,
+                min_idle_time=min_idle_time,
+                message_ids=ids,
+            )
+        )
+        return [[stream, claimed]]
+
+    def _id_bytes(self, _id):
+        if isinstance(_id, bytes):
+            return _id
+        return _id.encode(self.encoding)
+
+
+def _unsupported(e: ResponseError) -> bool:
+    """Whether ``e`` is a reply of Redis < 6.2 to ``XPENDING`` with ``IDLE`` or an
+    exclusive range.
+    """
+    message = str(e).lower()
+    return "unknown command" in message or "invalid stream id" in message
+
+
+class AckBuffer:
+    """Helper class that collects message ids to acknowledge and sends them with one
+    multi-ID ``XACK`` per stream, all in a single pipeline.
+
+    Parameters
+    ----------
+    client: StrictRedis
+        ``redis-py`` client instance to use.
+    group_name: str
+        Name of Redis consumer group.
+    batch_size: int
+        Number of collected ids after which ``.add()`` reports that the buffer should
+        be flushed. Defaults to 1000.
+    """
+
+    def __init__(self, client: StrictRedis, group_name: str, batch_size: int = 1000):
+        self.client = client
+        self.group = group_name
+        self.batch_size = batch_size
+        self._ids = defaultdict(list)
+        self._size = 0
+        self._lock = Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, stream, *ids) -> bool:
+        """Add message ids to acknowledge. Returns ``True`` if the buffer is full and
+        should be flushed.
+        """
+        with self._lock:
+            self._ids[stream].extend(ids)
+            self._size += len(ids)
+            return self._size >= self.batch_size
+
+    def flush(self):
+        """Acknowledge all collected ids. If the pipeline fails, the ids are put back
+        in the buffer, to be acknowledged with the next flush, and the error is
+        raised.
+        """
+        with self._lock:
+            ids, self._ids = self._ids, defaultdict(list)
+            self._size = 0
+        if len(ids) == 0:
+            return
+        pipe = self.client.pipeline(transaction=False)
+        for stream, _ids in ids.items():
+            pipe.xack(stream, self.group, *_ids)
+        try:
+            pipe.execute()
+        except Exception:
+            for stream, _ids in ids.items():
+                self.add(stream, *_ids)
+            raise
@@ -1,9 +1,17 @@
-from multiprocessing.queues import Empty
+import logging
+from queue import Empty
 
-from streamz_redis.sources.base import RedisSource
-from streamz_redis.sources.consumers import GroupConsumer
+from streamz_redis.executors import ReaderExecutor
+from streamz_redis.sources.base import RedisSource, check_lazy
+from streamz_redis.sources.consumers import AckBuffer, GroupConsumer
 from streamz_redis.sources.heart import Heart
+from streamz_redis.workers import Autoscaler, Supervisor, worker_name
 from tornado import gen
+from tornado.ioloop import PeriodicCallback
+from tornado.locks import Event, Semaphore
+from tornado.queues import Queue
+
+logger = logging.getLogger(__name__)
 
 
 class from_redis_consumer_group(RedisSource):
@@ -20,8 +28,25 @@ class from_redis_consumer_group(RedisSource):
         timeout: int = 0,
         count: int = None,
         replay_pending: bool = True,
+        replay_count: int = 1000,
         heartbeat_interval: int = None,
         claim_timeout: int = None,
+        emit_batches: bool = False,
+        ack_batch_size: int = None,
+        ack_interval: float = None,
+        prefetch: int = None,
+        loot_concurrency: int = 4,
+        partition_claims: bool = True,
+        liveness: str = "pubsub",
+        convert: bool = True,
+        encoding: str = "UTF-8",
+        fields: list = None,
+        lazy: bool = False,
+        schema: dict = None,
+        parse_replies: bool = False,
+        workers: int = None,
+        restart_delay: float = 1,
+        autoscale: dict = None,
         **kwargs,
     ):
         """Parameters
@@ -44,12 +69,16 @@ class from_redis_consumer_group(RedisSource):
         timeout: int or float
             Number of seconds to wait if there are no new messages in the stream.
             Defaults to 0 (wait indefinitely).
-        count: int
+        count: int or AdaptiveCount
             Number of items to emit at a time. If None, all available items are emitted.
-            Defaults to None.
+            An ``AdaptiveCount`` changes the number between reads depending on the
+            backlog and on downstream processing time. Defaults to None.
         replay_pending: bool
             Retrieve messages from PEL (pending entry list) when started. Defaults to
             True.
+        replay_count: int
+            PEL is replayed in pages of up to this many messages per stream. Each page
+            is emitted before the next one is read. Defaults to 1000.
         heartbeat_interval: int
             Interval at which this source will send heartbeats to the group's pub/sub
             channel. Defaults to None (heartbeats are turned off).
@@ -57,14 +86,91 @@ class from_redis_consumer_group(RedisSource):
             Number of seconds after which a consumer is considered dead and other
             consumers are free to steal its unacknowledged messages. The source will not
             steal messages if it's not sending heartbeats (the default). Defaults to 10.
+        emit_batches: bool
+            Emit all messages received with one ``XREADGROUP`` as a single list of
+            ``(stream-name, message-id, message-data)`` tuples instead of one by one.
+            The batch is acknowledged with one ``XACK`` per stream when it is fully
+            processed. Defaults to False.
+        ack_batch_size: int
+            Collect ids of processed messages and acknowledge them in one pipeline of
+            multi-ID ``XACK`` commands once this many are collected. Defaults to
+            ``None`` (acknowledge each message separately, unless ``ack_interval`` is
+            set).
+        ack_interval: int or float
+            Acknowledge collected ids at least every this many seconds. Defaults to
+            ``None``, or to 1 if ``ack_batch_size`` is set. Failed acknowledgements
+            are logged and retried with the next flush.
+        prefetch: int
+            Keep reading new messages while the previous ones are being processed,
+            holding up to this many replies in a queue. When the queue is full, reading
+            waits until there's room. Messages that are read but not emitted when the
+            source stops stay pending and are replayed on restart. Defaults to ``None``
+            (read only after the previous reply is emitted).
+        loot_concurrency: int
+            Maximum number of streams for which messages of dead consumers are claimed
+            at the same time. Claiming is done in the source's executor, one extra
+            worker is reserved for each. Defaults to 4.
+        partition_claims: bool
+            Split messages of a dead consumer between the surviving consumers that
+            send heartbeats, so that each of them claims only its own share instead of
+            all of them competing for the same messages. The split is redone with
+            the consumers alive on every round of claims, so the share of a consumer
+            that died too goes to the others. Requires Redis 6.2+. Defaults to True.
+        liveness: str
+            How consumers learn which peers are alive. ``"pubsub"`` (the default)
+            publishes heartbeats to the group's channel. ``"registry"`` keeps
+            heartbeat timestamps in a sorted set ``<group_name>:heartbeats``, so that
+            peers which died before this consumer started are detected too, and
+            scales to groups with hundreds of consumers.
         convert: bool
-            Convert ``bytes`` in the messages to ``str``. Defaults to True.
+            Convert ``bytes`` in the messages to ``str``. To decode at the connection
+            level instead, pass ``{"decode_responses": True}`` in ``client_params``.
+            Defaults to True.
         encoding: str
             This is the encoding that will be used to convert ``bytes`` to ``str`` if
             ``convert`` is True. Defaults to "UTF-8".
+        fields: list of str
+            If ``convert`` is True, only decode values of these fields and leave other
+            values as ``bytes``, e.g. to skip decoding binary payloads. Defaults to
+            ``None`` (decode all values).
+        lazy: bool
+            Emit ``StreamMessage`` objects instead of tuples. They unpack like the
+            tuples, but keep message data as received and decode fields on first
+            access. Can't be used with ``convert=False`` or ``fields``. Defaults to
+            False.
+        schema: dict
+            A dict of ``field-name: dtype``. If given, each reply is emitted as a
+            dict of NumPy arrays, one per field, plus ``stream``, ``id``, ``ts`` and
+            ``seq`` arrays, see ``streamz_redis.columns.to_columns``. Values are parsed
+            with vectorized NumPy conversions. Requires ``numpy``. Defaults to
+            ``None``.
+        parse_replies: bool
+            Parse replies to stream reads with a ``StreamReplyParser``, which builds
+            the decoded messages from raw replies in one pass, bypassing ``redis-py``'s
+            response callbacks. Defaults to False.
+        workers: int
+            Run the source and the pipeline downstream of it in this many worker
+            processes, to use more than one core. Each worker is a consumer named
+            ``<consumer_name>-<index>`` with connections of its own. Workers that exit
+            are restarted, and ``.stop()`` stops all of them. Results of the pipeline
+            stay in the workers, so it should end with sinks that write somewhere
+            else, like ``sink_to_redis_list``. Requires the ``fork`` start method.
+            Defaults to ``None`` (consume in this process).
+        restart_delay: int or float
+            Number of seconds between checks for exited workers. Defaults to 1.
+        autoscale: dict
+            Add and retire workers depending on the group's backlog. A dict of
+            parameters of ``streamz_redis.workers.Autoscaler``, like
+            ``{"max_workers": 8, "scale_up_at": 5000}``. ``workers`` is the initial
+            number of workers, and must be set. Retired workers drain with
+            ``.drain()``. Defaults to ``None`` (a fixed number of workers).
+        engine: str
+            ``"thread"`` (default) to read using a thread pool, ``"asyncio"`` to await
+            reads directly on the event loop using ``redis.asyncio``.
         **kwargs:
             Will be passed to ``streamz.Source``.
         """
+        check_lazy(lazy, convert, fields)
         super().__init__(client_params=client_params, **kwargs)
         self._streams = streams
         self._group = group_name
@@ -72,28 +178,123 @@ class from_redis_consumer_group(RedisSource):
         self._timeout = timeout
         self._count = count
         self._replay = replay_pending
+        self._replay_count = replay_count
+        self.replay_progress = {"replayed": 0, "pending": None}
         self._client_params = client_params
         self._heartbeat_interval = heartbeat_interval
         self._claim_timeout = claim_timeout
+        self._emit_batches = emit_batches
+        self._ack_batch_size = ack_batch_size
+        if ack_batch_size is not None and ack_interval is None:
+            ack_interval = 1  # don't leave a partly full buffer until stop()
+        self._ack_interval = ack_interval
+        self._acks = None
+        self._ack_flusher = None
+        self._prefetch = prefetch
+        self._loot_concurrency = loot_concurrency
+        self._partition_claims = partition_claims
+        self._liveness = liveness
+        self._convert = convert
+        self._encoding = encoding
+        self._fields = fields
+        self._lazy = lazy
+        self._schema = schema
+        self._parse_replies = parse_replies
+        self._dead = {}
+        self._draining = False
+        self._finished = Event()
         self._consumer = None
         self._heart = None
+        self._supervisor = None
+        self._autoscaler = None
+        if workers is not None:
+            self._supervisor = Supervisor(
+                self, workers, setup=self._setup_worker, restart_delay=restart_delay
+            )
+        if autoscale is not None:
+            if self._supervisor is None:
+                raise ValueError("autoscale requires workers")
+            self._autoscaler = Autoscaler(
+                self._supervisor,
+                streams=list(GroupConsumer._convert_streams(streams, "0")),
+                group=group_name,
+                consumer_name=consumer_name,
+                client_params=client_params,
+                **autoscale,
+            )
+
+    def start(self):
+        if self._supervisor is not None:
+            self.stopped = False
+            self._supervisor.start()
+            if self._autoscaler is not None:
+                self._autoscaler.start()
+            return
+        self._draining = False
+        self._finished.clear()
+        super().start()
 
     def stop(self):
+        if self._supervisor is not None:
+            if self._autoscaler is not None:
+                self._autoscaler.stop()
+            self._supervisor.stop()
+            self.stopped = True
+            return
         if self._heart is not None:
             self._heart.stop()
-        self.stopped = True
+        if self._ack_flusher is not None:
+            self._ack_flusher.stop()
+        if self._acks is not None:
+            self._acks.flush()
+        super().stop()
+
+    def _reader_count(self) -> int:
+        if self._heartbeat_interval is None:
+            return 1
+        return 1 + self._loot_concurrency
+
+    def _setup_worker(self, index):
+        """Turn this copy of the source into worker number ``index``."""
+        self._supervisor = None
+        self._autoscaler = None
+        self._name = worker_name(self._name, index)
+        self._client = None
+        self._blocking_client = None
+        self._async_client = None
+        # threads of the parent's executor don't exist here
+        self._executor = ReaderExecutor(thread_name_prefix=type(self).__name__)
+        self._own_executor = True
+        self._registered = 0
 
     @gen.coroutine
     def _run(self):
         self._consumer = GroupConsumer(
-            client=self._redis,
+            client=self._reader,
+            command_client=self._redis,
             streams=self._streams,
             group_name=self._group,
             consumer_name=self._name,
             count=self._count,
             block=int(self._timeout * 1000),
+            async_client=self._aredis if self._engine == "asyncio" else None,
+            convert=self._convert,
+            encoding=self._encoding,
+            fields=self._fields,
+            lazy=self._lazy or self._schema is not None,
+            parse_replies=self._parse_replies,
         )
 
+        if self._ack_batch_size is not None or self._ack_interval is not None:
+            self._acks = AckBuffer(
+                self._redis, self._group, batch_size=self._ack_batch_size or 1000
+            )
+        if self._ack_interval is not None:
+            self._ack_flusher = PeriodicCallback(
+                self._flush_acks, self._ack_interval * 1000
+            )
+            self._ack_flusher.start()
+
         if self._heartbeat_interval is not None:
             self._heart = Heart(
                 streams=list(self._consumer.streams),
@@ -102,6 +303,7 @@ class from_redis_consumer_group(RedisSource):
                 client_params=self._client_params,
                 interval=self._heartbeat_interval,
                 timeout=self._claim_timeout,
+                liveness=self._liveness,
             )
             self._heart.start()
             self.loop.add_callback(self._loot)
@@ -109,48 +311,176 @@ class from_redis_consumer_group(RedisSource):
         if self._replay:
             yield self._emit_pending()
 
-        while not self.stopped:
-            if self._heart is not None and not self._heart.is_alive():
-                break
-            res = yield self._run_in_executor(self._consumer.consume)
-            yield self._emit_streams_response(res, ack=self._ack)
+        queue = None
+        if self._prefetch is not None:
+            queue = Queue(maxsize=self._prefetch)
+            self.loop.add_callback(self._fetch, queue)
 
-        if self._heart is not None:
+        try:
+            while not self.stopped:
+                if self._heart is not None and not self._heart.is_alive():
+                    break
+                if queue is None:
+                    if self._draining:
+                        break
+                    res = yield self._read(
+                        self._consumer.consume, self._consumer.consume_async
+                    )
+                else:
+                    res = yield queue.get()
+                    if res is None:
+                        queue = None  # the reader is done
+                        break
+                    if isinstance(res, Exception):
+                        queue = None
+                        raise res
+                yield self._emit_and_adapt(
+                    res, self._count, ack=self._ack, batches=self._emit_batches
+                )
+        except Exception:
+            # nothing is read anymore, let peers claim what's pending
+            self.stopped = True
+            if self._heart is not None:
+                self._heart.stop()
+            self._finished.set()
+            raise
+
+        if queue is not None:
+            self.stopped = True
+            while (yield queue.get()) is not None:
+                pass  # let the reader finish, unprocessed messages stay pending
+
+        if self._heart is not None and not self._draining:
             self._heart.stop()
+        self._finished.set()
+
+    @gen.coroutine
+    def drain(self, timeout: float = 60):
+        """Stop reading new messages, wait until the messages already read are
+        processed and acknowledged, and stop the source. Gives up waiting after
+        ``timeout`` seconds, leaving the rest pending. Heartbeats are sent until the
+        source stops, so that peers don't claim the messages in the meantime.
+        """
+        self._draining = True
+        deadline = self.loop.time() + timeout
+        try:
+            yield self._finished.wait(timeout=deadline)
+        except gen.TimeoutError:
+            pass
+        while self.loop.time() < deadline:
+            if self._acks is not None and len(self._acks) > 0:
+                yield self._run_in_executor(self._acks.flush)
+            pending = yield self._run_in_executor(self._consumer.count_pending)
+            if pending == 0:
+                break
+            yield gen.sleep(0.1)
+        self.stop()
+
+    @gen.coroutine
+    def _fetch(self, queue):
+        """Read replies into ``queue`` until the source is stopped, then put ``None``.
+        If a read fails, the exception is put before ``None``, to be raised by the
+        consuming side.
+        """
+        try:
+            while not self.stopped and not self._draining:
+                res = yield self._read(
+                    self._consumer.consume, self._consumer.consume_async
+                )
+                yield queue.put(res)
+        except Exception as e:
+            yield queue.put(e)
+        yield queue.put(None)
 
     def _ack(self, stream, *ids):
         def cb():
-            self._consumer.ack(stream, *ids)
+            if self._acks is None:
+                self._consumer.ack(stream, *ids)
+            elif self._acks.add(stream, *ids):
+                self._flush_acks()
 
         return cb
 
+    def _flush_acks(self):
+        if len(self._acks) > 0:
+            future = self._run_in_executor(self._acks.flush)
+            future.add_done_callback(self._acks_flushed)
+
+    def _acks_flushed(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to acknowledge messages", exc_info=future.exception())
+
     @gen.coroutine
     def _emit_pending(self):
-        res = yield self._run_in_executor(self._consumer.consume, True)
-        yield self._emit_streams_response(res, ack=self._ack)
+        """Replay this consumer's PEL page by page. ``replay_progress`` shows the number
+        of messages ``replayed`` so far, out of ``pending`` when the replay started.
+        """
+        pending = yield self._run_in_executor(self._consumer.count_pending)
+        self.replay_progress = {"replayed": 0, "pending": pending}
+        cursors = {s: "0" for s in self._consumer.streams}
+        while len(cursors) > 0 and not self.stopped:
+            res = yield self._read(
+                self._consumer.read_pending,
+                self._consumer.read_pending_async,
+                cursors,
+                self._replay_count,
+            )
+            self.replay_progress["replayed"] += sum(len(m) for _, m in res)
+            yield self._emit_streams_response(
+                res, ack=self._ack, batches=self._emit_batches
+            )
 
     @gen.coroutine
     def _loot(self):
-        dead = set()
-        while not self.stopped:
-            dead |= self._get_dead()
-            empty = set()
-            for con, last in dead:
-                res = self._consumer.steal_pending(con, int(last * 1000))
-                messages = sum(len(m) for _, m in res)
-                while messages > 0:
-                    yield self._emit_streams_response(res, ack=self._ack)
-                    res = self._consumer.steal_pending(con, int(last * 1000))
-                    messages = sum(len(m) for _, m in res)
-                empty.add((con, last))
-            dead -= empty
-            yield gen.sleep(self._claim_timeout)
+        semaphore = Semaphore(self._loot_concurrency)
+        while not self.stopped and not self._draining:
+            min_idle_time = int(self._heart.timeout * 1000)
+            self._dead.update(self._get_dead())
+            if self._partition_claims:
+                # split between the consumers alive now, not when the peer died
+                self._dead = dict.fromkeys(self._dead, self._heart.live())
+            yield [
+                self._loot_stream(semaphore, stream, con, min_idle_time, members)
+                for con, members in self._dead.items()
+                for stream in self._consumer.streams
+            ]
+            for con in list(self._dead):
+                pending = yield self._run_in_executor(self._consumer.count_pending, con)
+                if pending == 0:
+                    del self._dead[con]
+            yield gen.sleep(self._heart.timeout)
+
+    @gen.coroutine
+    def _loot_stream(self, semaphore, stream, consumer, min_idle_time, members=None):
+        """Claim and emit messages of a dead consumer in one stream, until there are
+        none left. Claiming is done in the executor, emitting goes through the same
+        path as for new messages. With ``members``, only this consumer's share is
+        claimed, the rest is left to the other members.
+        """
+        with (yield semaphore.acquire()):
+            while not self.stopped:
+                res = yield self._run_in_executor(
+                    self._consumer.steal_stream,
+                    stream,
+                    consumer,
+                    min_idle_time,
+                    members,
+                )
+                if sum(len(m) for _, m in res) == 0:
+                    break
+                yield self._emit_streams_response(
+                    res, ack=self._ack, batches=self._emit_batches
+                )
 
     def _get_dead(self):
-        S = set()
+        """Drain the heart's ``dead`` queue into a dict of ``consumer: members``.
+        ``members`` is ``None`` if claims aren't partitioned.
+        """
+        D = {}
         while True:
             try:
-                S.add(self._heart.dead.get(block=False))
+                con, _, members = self._heart.dead.get(block=False)
             except Empty:
                 break
-        return S
+            D[con] = members if self._partition_claims else None
+        return D
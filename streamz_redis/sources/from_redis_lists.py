@@ -36,6 +36,9 @@ class from_redis_lists(RedisSource):
             new items are added to the list. Defaults to ``0``.
         left: bool
             Use ``BLPOP`` if ``True``, ``BRPOP`` otherwise. Defaults to ``True``.
+        engine: str
+            ``"thread"`` (default) to read using a thread pool, ``"asyncio"`` to await
+            reads directly on the event loop using ``redis.asyncio``.
         **kwargs:
             Will be passed to ``streamz.Source``.
         """
@@ -51,10 +54,15 @@ class from_redis_lists(RedisSource):
     def _pop(self):
         return self._popmethod(self._keys, timeout=self._timeout)
 
+    async def _pop_async(self):
+        client = self._aredis
+        popmethod = client.blpop if self._left else client.brpop
+        return await popmethod(self._keys, timeout=self._timeout)
+
     @gen.coroutine
     def _run(self):
-        self._popmethod = self._redis.blpop if self._left else self._redis.brpop
+        self._popmethod = self._reader.blpop if self._left else self._reader.brpop
         while not self.stopped:
-            x = yield self._run_in_executor(self._pop)
+            x = yield self._read(self._pop, self._pop_async)
             if x is not None:
                 yield self._emit(x)
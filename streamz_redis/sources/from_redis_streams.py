@@ -1,8 +1,15 @@
+import logging
+from concurrent.futures import Future, wait
+from threading import Lock
 from typing import Union
 
-from streamz_redis.sources.base import RedisSource
+from streamz_redis.checkpoints import Checkpointer, CheckpointStore
+from streamz_redis.sources.base import RedisSource, check_lazy
 from streamz_redis.sources.consumers import Consumer
 from tornado import gen
+from tornado.ioloop import PeriodicCallback
+
+logger = logging.getLogger(__name__)
 
 
 class from_redis_streams(RedisSource):
@@ -17,6 +24,14 @@ class from_redis_streams(RedisSource):
         default_start_id: int = "$",
         convert: bool = True,
         encoding: str = "UTF-8",
+        emit_batches: bool = False,
+        fields: list = None,
+        lazy: bool = False,
+        schema: dict = None,
+        parse_replies: bool = False,
+        checkpoint: CheckpointStore = None,
+        checkpoint_every: int = 1000,
+        checkpoint_interval: float = 1,
         **kwargs,
     ):
         """
@@ -35,22 +50,65 @@ class from_redis_streams(RedisSource):
             Number of seconds to wait if there are no new messages in the stream. If
            there are none, this is effectively like a polling interval. Defaults to 0
            (wait indefinitely).
-        count: int
+        count: int or AdaptiveCount
             Number of items to emit at a time. If None, all available items are emitted.
-            Defaults to None.
+            An ``AdaptiveCount`` changes the number between reads depending on the
+            backlog and on downstream processing time. Defaults to None.
         default_start_id: str
             In cases when ``streams`` isn't a dict, this is the default starting
             message-id that's used. Defaults to `"$"`, so will start reading only new
             messages. Another possible value is `"0"` to start reading from the
             beginning of the stream.
         convert: bool
-            Convert ``bytes`` in the messages to ``str``. Defaults to True.
+            Convert ``bytes`` in the messages to ``str``. To decode at the connection
+            level instead, pass ``{"decode_responses": True}`` in ``client_params``.
+            Defaults to True.
         encoding: str
             This is the encoding that will be used to convert ``bytes`` to ``str`` if
             ``convert`` is True. Defaults to "UTF-8".
+        emit_batches: bool
+            Emit all messages received with one ``XREAD`` as a single list of
+            ``(stream-name, message-id, message-data)`` tuples instead of one by one.
+            Defaults to False.
+        fields: list of str
+            If ``convert`` is True, only decode values of these fields and leave other
+            values as ``bytes``, e.g. to skip decoding binary payloads. Defaults to
+            ``None`` (decode all values).
+        lazy: bool
+            Emit ``StreamMessage`` objects instead of tuples. They unpack like the
+            tuples, but keep message data as received and decode fields on first
+            access. Can't be used with ``convert=False`` or ``fields``. Defaults to
+            False.
+        schema: dict
+            A dict of ``field-name: dtype``. If given, each reply is emitted as a
+            dict of NumPy arrays, one per field, plus ``stream``, ``id``, ``ts`` and
+            ``seq`` arrays, see ``streamz_redis.columns.to_columns``. Values are parsed
+            with vectorized NumPy conversions. Requires ``numpy``. Defaults to
+            ``None``.
+        parse_replies: bool
+            Parse replies to stream reads with a ``StreamReplyParser``, which builds
+            the decoded messages from raw replies in one pass, bypassing ``redis-py``'s
+            response callbacks. Defaults to False.
+        checkpoint: CheckpointStore
+            Store to persist positions in, e.g. ``RedisCheckpointStore`` or
+            ``FileCheckpointStore``. On start, streams with a saved position are read
+            from after it instead of from ``default_start_id``. A position is only
+            saved once the message and all messages before it are processed
+            downstream. Saves run in the executor and failed ones are logged; the
+            save made by ``.stop()`` raises. Defaults to ``None`` (positions are kept
+            in memory only).
+        checkpoint_every: int
+            Save positions after this many messages are processed. Defaults to 1000.
+        checkpoint_interval: int or float
+            Save positions at least every this many seconds, if they changed. They
+            are also saved when the source is stopped. Defaults to 1.
+        engine: str
+            ``"thread"`` (default) to read using a thread pool, ``"asyncio"`` to await
+            reads directly on the event loop using ``redis.asyncio``.
         **kwargs:
             Will be passed to ``streamz.Source``.
         """
+        check_lazy(lazy, convert, fields)
         super().__init__(client_params=client_params, **kwargs)
         self._streams = streams
         self._timeout = timeout
@@ -58,21 +116,104 @@ class from_redis_streams(RedisSource):
         self._convert = convert
         self._encoding = encoding
         self._default = default_start_id
+        self._emit_batches = emit_batches
+        self._fields = fields
+        self._lazy = lazy
+        self._schema = schema
+        self._parse_replies = parse_replies
+        self._checkpointer = None
+        if checkpoint is not None:
+            self._checkpointer = Checkpointer(checkpoint, every=checkpoint_every)
+        self._checkpoint_interval = checkpoint_interval
+        self._checkpoint_saver = None
+        self._saving = None
+        # the checkpointer is updated on the loop, but stop() may run on any thread
+        self._checkpoint_lock = Lock()
+
+    def stop(self):
+        if self._checkpoint_saver is not None:
+            self._checkpoint_saver.stop()
+        try:
+            if self._checkpointer is not None:
+                self._save_last_checkpoint()
+        finally:
+            super().stop()
+
+    def _save_last_checkpoint(self):
+        """Save all positions on the caller's thread, after the save running in the
+        executor, if any.
+        """
+        with self._checkpoint_lock:
+            saving = self._saving
+            self._checkpointer.collect()
+            # all positions, in case a save on the loop failed
+            positions = dict(self._checkpointer.positions)
+            # saves started on the loop from now on wait for this one
+            self._saving = final = Future()
+        if saving is not None:
+            wait([saving])
+        try:
+            self._checkpointer.store.save(positions)
+        finally:
+            final.set_result(None)
 
     @gen.coroutine
     def _run(self):
         consumer = Consumer(
-            client=self._redis,
+            client=self._reader,
             streams=self._streams,
             count=self._count,
             block=int(self._timeout * 1000),
             default_start_id=self._default,
             convert=self._convert,
-            encoding=self._convert,
+            encoding=self._encoding,
+            async_client=self._aredis if self._engine == "asyncio" else None,
+            fields=self._fields,
+            lazy=self._lazy or self._schema is not None,
+            parse_replies=self._parse_replies,
         )
+        track = None
+        if self._checkpointer is not None:
+            saved = yield self._run_in_executor(
+                self._checkpointer.store.load, list(consumer.streams)
+            )
+            consumer.streams.update(saved)
+            self._checkpointer.positions.update(saved)
+            track = self._track
+            self._checkpoint_saver = PeriodicCallback(
+                self._save_checkpoint, self._checkpoint_interval * 1000
+            )
+            self._checkpoint_saver.start()
+
         while not self.stopped:
-            res = yield self.loop.run_in_executor(None, consumer.consume)
-            if len(res) > 0:
-                for stream, messages in res:
-                    for _id, data in messages:
-                        yield self._emit((stream, _id, data))
+            res = yield self._read(consumer.consume, consumer.consume_async)
+            yield self._emit_and_adapt(
+                res, self._count, ack=track, batches=self._emit_batches
+            )
+
+    def _track(self, stream, *ids):
+        with self._checkpoint_lock:
+            done = self._checkpointer.track(stream, *ids)
+
+        def cb():
+            with self._checkpoint_lock:
+                done()
+            if self._checkpointer.due:
+                self._save_checkpoint()
+
+        return cb
+
+    def _save_checkpoint(self):
+        with self._checkpoint_lock:
+            if self._saving is not None and not self._saving.done():
+                return  # saves must not overtake each other, try again later
+            positions = self._checkpointer.collect()
+            if len(positions) > 0:
+                self._saving = self._executor.submit(
+                    self._checkpointer.store.save, positions
+                )
+                self._saving.add_done_callback(self._saved)
+
+    def _saved(self, future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("Failed to save checkpoint", exc_info=future.exception())
@@ -1,18 +1,181 @@
+import logging
+import os
 import time
-from multiprocessing import Event, Process, Queue
+from queue import Queue
+from threading import Event, Lock, Thread
 from typing import Union
 
-from redis import StrictRedis
+from streamz_redis.pools import _normalize, get_blocking_client, get_client
 from streamz_redis.sources.consumers import convert_bytes
 
+logger = logging.getLogger(__name__)
+_lock = Lock()
+_services = {}
 
-class Heart(Process):
+
+def _reset_services():
+    # service threads don't survive a fork and their locks may be held, so workers
+    # forked by a ``Supervisor`` start services of their own
+    global _lock, _services
+    _lock = Lock()
+    _services = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_services)
+
+
+class HeartbeatService:
+    """Sends and receives heartbeats for all hearts in the process that talk to the
+    same Redis server.
+
+    The service runs in a single daemon thread, so heartbeats are sent on time even
+    if the event loop is busy. On each tick, heartbeats of all hearts that are due are
+    sent with one pipeline, and a single pub/sub connection subscribed to the
+    channels of all their groups receives the heartbeats of peers (only hearts with
+    ``"pubsub"`` liveness need it). The thread is started when the first heart is
+    registered and exits when the last one leaves. Errors, e.g. a lost connection,
+    are logged and the thread carries on with the next tick.
+
+    Use ``get_service()`` to get the shared instance rather than creating one.
+    """
+
+    def __init__(self, client_params: dict = None):
+        self.client_params = client_params
+        self.redis = get_client(client_params)
+        self.hearts = {}
+        self._lock = Lock()
+        self._thread = None
+
+    def register(self, heart: "Heart"):
+        heart.redis = self.redis
+        with self._lock:
+            self.hearts[(heart.group, heart.name)] = heart
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self.run, name="streamz-redis-heart", daemon=True
+                )
+                self._thread.start()
+
+    def unregister(self, heart: "Heart"):
+        with self._lock:
+            if self.hearts.get((heart.group, heart.name)) is heart:
+                del self.hearts[(heart.group, heart.name)]
+
+    def run(self):
+        sub = get_blocking_client(self.client_params).pubsub(
+            ignore_subscribe_messages=True
+        )
+        try:
+            while True:
+                with self._lock:
+                    hearts = list(self.hearts.values())
+                    if len(hearts) == 0:
+                        # in the same block, so a heart registered right after this
+                        # starts a new thread instead of relying on this one
+                        self._thread = None
+                        return
+                interval = min(h.interval for h in hearts)
+                try:
+                    self._subscribe(sub, hearts)
+                    self.beat(hearts)
+                    self._listen(sub, interval)
+                except Exception:
+                    logger.exception("Heartbeat service tick failed")
+                    time.sleep(interval)  # don't spin while Redis is unreachable
+        except BaseException:
+            # if the thread dies anyway, hearts stop hearing their own heartbeats and
+            # their sources stop, the next registered heart starts a new thread
+            with self._lock:
+                self._thread = None
+            raise
+        finally:
+            sub.close()
+
+    def beat(self, hearts: list):
+        """Publish heartbeats of the hearts that are due and check their peers."""
+        now = time.time()
+        due = [h for h in hearts if h.due(now)]
+        if len(due) == 0:
+            return
+        pipe = self.redis.pipeline(transaction=False)
+        for heart in due:
+            if heart.liveness == "registry":
+                pipe.zadd(heart.registry_key, {heart.name: now})
+            else:
+                pipe.publish(heart.group, heart.name)
+            heart.last_sent = now
+        pipe.execute()
+        for heart in due:
+            if heart.liveness == "registry":
+                heart.last_heartbeat = now  # the write went through
+            try:
+                heart.check_dead()
+            except Exception:
+                logger.exception("Failed to check peers of consumer %s", heart.name)
+
+    def _subscribe(self, sub, hearts):
+        groups = set(h.group for h in hearts if h.liveness == "pubsub")
+        subscribed = set(convert_bytes(c) for c in sub.channels)
+        if groups - subscribed:
+            sub.subscribe(*(groups - subscribed))
+        if subscribed - groups:
+            sub.unsubscribe(*(subscribed - groups))
+
+    def _listen(self, sub, seconds):
+        """Handle incoming heartbeats for ``seconds``."""
+        deadline = time.monotonic() + seconds
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                return
+            message = sub.get_message(timeout=left)
+            if message is None:
+                continue
+            message = convert_bytes(message)
+            with self._lock:
+                hearts = [
+                    h for h in self.hearts.values() if h.group == message["channel"]
+                ]
+            for heart in hearts:
+                try:
+                    heart.handle_heartbeat(message)
+                except Exception:
+                    logger.exception("Failed to handle heartbeat %s", message)
+
+
+def get_service(client_params: dict = None) -> HeartbeatService:
+    """Get the heartbeat service of this process for ``client_params``, creating it if
+    needed.
     """
-    A process designed to be running alongside a consumer and handling inter-consumer
-    communication related to fault tolerance. Hearts will send "heartbeats" to a pub/sub
-    channel named after the consumer group.
+    key, _, _ = _normalize(client_params)
+    with _lock:
+        if key not in _services:
+            _services[key] = HeartbeatService(client_params)
+        return _services[key]
+
+
+class Heart:
+    """
+    Handles inter-consumer communication related to fault tolerance for a consumer.
+    Hearts will send "heartbeats" to a pub/sub channel named after the consumer group.
+    All hearts in a process that use the same Redis server share one
+    ``HeartbeatService``, see ``get_service()``.
+
+    When a peer is considered dead, a ``(consumer, last-heartbeat, live-consumers)``
+    tuple is put into the ``dead`` queue. ``live-consumers`` is a sorted list of
+    consumers that sent heartbeats recently, including this one, so that survivors
+    can split the dead consumer's messages between them.
+
+    With ``liveness="registry"``, heartbeats are written as timestamps to a sorted
+    set per group (``registry_key``) instead of being published. A consumer started
+    after a peer died can still tell it's dead, and finding dead peers takes a single
+    ``ZRANGEBYSCORE``, no matter how many consumers are in the group. Consumers that
+    are gone and have nothing pending are removed from the set.
     """
 
+    livenesses = ("pubsub", "registry")
+
     def __init__(
         self,
         streams: Union[str, list],
@@ -21,11 +184,15 @@ class Heart(Process):
         client_params: dict = None,
         interval: int = 1,
         timeout=None,
-        **kwargs,
+        service: HeartbeatService = None,
+        liveness: str = "pubsub",
     ):
-        kwargs["daemon"] = True
-        super().__init__(name=name, **kwargs)
+        if liveness not in self.livenesses:
+            raise ValueError(f"liveness must be one of {self.livenesses}")
+        self.liveness = liveness
+        self.registry_key = f"{group}:heartbeats"
         self.group = group
+        self.name = name
         self.streams = streams
         if isinstance(streams, str):
             self.streams = [streams]
@@ -33,40 +200,83 @@ class Heart(Process):
         self.interval = interval
         self.timeout = timeout or interval * 10
         self.heartbeats = {}
+        self.seen = set()
+        self.members = [name]
         self.last_heartbeat = None
+        self.last_sent = None
+        self.started = None
         self.dead = Queue()
         self.stopped = Event()
+        self.service = service
         self.redis = None
 
-    def run(self):
-        self.redis = StrictRedis(**self.client_params or {})
-
-        sub = self.redis.pubsub()
-        sub.subscribe(**{self.group: self.handle_heartbeat})
-        thread = sub.run_in_thread(daemon=True)
-
-        while not self.stopped.is_set():
-            self.redis.publish(self.group, self.name)
-            self.check_dead()
-            time.sleep(self.interval)
-            if (
-                self.last_heartbeat is None
-                or time.time() - self.last_heartbeat > self.timeout
-            ):
-                break
-
-        thread.stop()
+    def start(self):
+        if self.service is None:
+            self.service = get_service(self.client_params)
+        self.stopped.clear()
+        self.started = time.time()
+        self.service.register(self)
 
     def stop(self):
         self.stopped.set()
+        if self.service is not None:
+            self.service.unregister(self)
+
+    def is_alive(self) -> bool:
+        """Whether the heart is running and hears its own heartbeats."""
+        if self.started is None or self.stopped.is_set():
+            return False
+        last = self.last_heartbeat or self.started
+        return time.time() - last <= self.timeout
+
+    def due(self, now: float) -> bool:
+        return self.last_sent is None or now - self.last_sent >= self.interval
 
     def check_dead(self):
-        have_pending = set()
-        for stream in self.streams:
-            info = convert_bytes(self.redis.xpending(stream, self.group))
-            have_pending |= set(c["name"] for c in info["consumers"])
+        """Find peers that have pending messages but stopped sending heartbeats. The
+        ``XPENDING`` summaries of all streams, and with the registry, the lookup of
+        dead and live consumers, are sent in one pipeline.
+        """
         now = time.time()
+        pipe = self.redis.pipeline(transaction=False)
+        for stream in self.streams:
+            pipe.xpending(stream, self.group)
+        if self.liveness == "registry":
+            pipe.zrangebyscore(
+                self.registry_key, "-inf", f"({now - self.timeout}", withscores=True
+            )
+            pipe.zrangebyscore(self.registry_key, now - self.timeout, "+inf")
+        res = convert_bytes(pipe.execute())
+        have_pending = set(
+            c["name"] for info in res[: len(self.streams)] for c in info["consumers"]
+        )
+        if self.liveness == "registry":
+            self._check_registry(have_pending, res[-2], res[-1], now)
+        else:
+            self._check_heartbeats(have_pending, now)
+
+    def _check_registry(self, have_pending, dead, live, now):
+        self.members = sorted(set(live) | {self.name})
+        stale = []
+        for con, last in dead:
+            if con == self.name:
+                continue
+            if con not in have_pending:
+                stale.append(con)  # gone for good, nothing to claim
+            elif self.heartbeats.get(con, last) is not None:
+                self.dead.put((con, last, self.members))
+                self.heartbeats[con] = None  # mark dead
+        for con in live:
+            self.heartbeats.pop(con, None)  # back online
+        if len(stale) > 0:
+            self.redis.zrem(self.registry_key, *stale)
+        registered = set(live) | set(con for con, _ in dead)
+        self._check_heartbeats(have_pending - registered, now)
+
+    def _check_heartbeats(self, have_pending, now):
         for con in have_pending:
+            if con == self.name:
+                continue
             if con not in self.heartbeats:
                 self.heartbeats[con] = now  # consider yet unseen consumers alive
                 continue
@@ -74,9 +284,24 @@ class Heart(Process):
             if last is None:
                 continue  # skip dead
             if now - last > self.timeout:
-                self.dead.put((con, last))  # notify main process that a peer is dead
+                # notify the source that a peer is dead
+                self.dead.put((con, last, self.live(now)))
                 self.heartbeats[con] = None  # mark dead
 
+    def live(self, now=None):
+        """Sorted names of consumers that sent heartbeats within ``timeout``,
+        including this one.
+        """
+        if self.liveness == "registry":
+            return self.members
+        now = now or time.time()
+        live = {self.name}
+        for con in list(self.seen):  # updated by the service thread
+            last = self.heartbeats.get(con)
+            if last is not None and now - last <= self.timeout:
+                live.add(con)
+        return sorted(live)
+
     def handle_heartbeat(self, message):
         now = time.time()
         con = convert_bytes(message)["data"]
@@ -84,3 +309,4 @@ class Heart(Process):
             self.last_heartbeat = now
         else:
             self.heartbeats[con] = now
+            self.seen.add(con)
@@ -0,0 +1,56 @@
+import pytest
+from redis import StrictRedis
+from streamz_redis.checkpoints import (
+    Checkpointer,
+    FileCheckpointStore,
+    RedisCheckpointStore,
+)
+from streamz_redis.tests import uuid
+
+
+def test_checkpointer_out_of_order():
+    cp = Checkpointer(None, every=3)
+    done = [cp.track("s", f"{i}-0") for i in range(4)]
+
+    done[1]()
+    assert cp.collect() == {}  # 0-0 isn't processed yet
+    done[0]()
+    done[3]()
+    assert cp.collect() == {"s": "1-0"}
+    assert cp.positions == {"s": "1-0"}
+    done[2]()
+    assert cp.collect() == {"s": "3-0"}
+
+
+def test_checkpointer_due():
+    cp = Checkpointer(None, every=2)
+    cp.track("s", "1-0")()
+    assert not cp.due
+    cp.track("s", "2-0", "3-0")()
+    assert cp.due
+    cp.collect()
+    assert not cp.due
+
+
+def test_checkpointer_batch():
+    cp = Checkpointer(None)
+    cp.track("a", b"1-0", b"2-0")()
+    assert cp.collect() == {"a": "2-0"}
+
+
+def test_file_store(tmp_path):
+    store = FileCheckpointStore(str(tmp_path / "positions.json"))
+    assert store.load(["a"]) == {}
+    store.save({"a": "1-0", "b": "2-0"})
+    store.save({"a": "3-0"})
+    assert store.load(["a", "b", "c"]) == {"a": "3-0", "b": "2-0"}
+
+
+@pytest.mark.usefixtures("redis")
+def test_redis_store():
+    key = uuid()
+    store = RedisCheckpointStore(key)
+    assert store.load(["a"]) == {}
+    store.save({"a": "1-0", "b": "2-0"})
+    assert store.load(["a", "b", "c"]) == {"a": "1-0", "b": "2-0"}
+    assert StrictRedis().hget(key, "a") == b"1-0"
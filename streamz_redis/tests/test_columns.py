@@ -0,0 +1,52 @@
+import pytest
+from streamz_redis.columns import to_columns
+
+np = pytest.importorskip("numpy")
+
+
+def test_to_columns():
+    result = [
+        ["s1", [("5-1", {b"x": b"1.5", b"n": b"2", b"name": b"\xc3\xa9"})]],
+        ["s2", [("6-0", {b"x": b"-3", b"n": b"4"}), ("7-0", None)]],
+    ]
+    schema = {"x": np.float64, "n": "i4", "name": str}
+    columns = to_columns(result, schema)
+
+    assert columns["stream"].tolist() == ["s1", "s2"]
+    assert columns["id"].tolist() == ["5-1", "6-0"]
+    assert columns["ts"].tolist() == [5, 6]
+    assert columns["seq"].tolist() == [1, 0]
+    assert columns["ts"].dtype == np.int64
+    assert columns["x"].dtype == np.float64
+    assert columns["x"].tolist() == [1.5, -3.0]
+    assert columns["n"].dtype == np.int32
+    assert columns["n"].tolist() == [2, 4]
+    assert columns["name"].tolist() == ["é", ""]
+
+
+def test_to_columns_empty():
+    columns = to_columns([["s", []]], {"x": float})
+    assert len(columns["id"]) == 0
+    assert columns["x"].dtype == np.float64
+    assert columns["ts"].dtype == np.int64
+
+
+def test_to_columns_missing_float():
+    columns = to_columns([["s", [("1-0", {b"y": b"1"})]]], {"x": float})
+    assert np.isnan(columns["x"][0])
+
+
+def test_to_columns_missing_int():
+    result = [["s", [("1-0", {b"n": b"2"}), ("2-0", {b"y": b"1"})]]]
+    columns = to_columns(result, {"n": "i4", "b": bool})
+    assert columns["n"].dtype == np.int32
+    assert columns["n"].tolist() == [2, None]
+    assert columns["b"].mask.all()
+
+    with pytest.raises(ValueError, match="'n'"):
+        to_columns([["s", [("1-0", {b"n": b"x"})]]], {"n": int})
+
+
+def test_to_columns_decoded():
+    columns = to_columns([["s", [("1-0", {"x": "2"})]]], {"x": int})
+    assert columns["x"].tolist() == [2]
@@ -1,8 +1,20 @@
+import time
 from concurrent.futures import ThreadPoolExecutor
 
 import pytest
 from redis import StrictRedis
-from streamz_redis.sources.consumers import Consumer, GroupConsumer, convert_bytes
+from redis.exceptions import ResponseError
+from streamz_redis.sources.consumers import (
+    AckBuffer,
+    AdaptiveCount,
+    Consumer,
+    GroupConsumer,
+    StreamReplyParser,
+    convert_bytes,
+    decode_messages,
+    decode_streams_response,
+)
+from streamz_redis.messages import StreamID
 from streamz_redis.tests import uuid
 
 
@@ -16,6 +28,28 @@ def test_convert():
     assert convert_bytes(data) == [["stream", [("0", {"i": 1}), ("1", {"i": "x"})]]]
 
 
+def test_convert_encoding():
+    assert convert_bytes([{"é".encode("cp1252"): (b"\xe9",)}], "cp1252") == [
+        {"é": ("é",)}
+    ]
+
+
+def test_decode_streams_response():
+    res = [
+        [b"s1", [(b"1-0", {b"a": b"x", b"b": b"\x00\xff"}), (b"2-0", None)]],
+        [b"s2", []],
+    ]
+    first = [[b"s1", res[0][1][:1]]]
+    assert decode_streams_response(first, "latin-1") == convert_bytes(first, "latin-1")
+    assert decode_streams_response(res, fields=["a"]) == [
+        ["s1", [("1-0", {"a": "x", "b": b"\x00\xff"}), ("2-0", None)]],
+        ["s2", []],
+    ]
+    assert decode_messages(res[0][1][:1], "latin-1") == [
+        ("1-0", {"a": "x", "b": "\x00\xff"})
+    ]
+
+
 def test_consumer_defaults(redis: StrictRedis, data):
     stream = uuid()
     consumer = Consumer(redis, stream)
@@ -162,3 +196,311 @@ def test_group_consumer_claim_parallel(redis: StrictRedis, data):
     r2 = con2.claim_pending(stream, con, 0)
 
     assert len(r1[0][1] + r2[0][1]) == 10
+
+
+@pytest.mark.n(10)
+def test_group_consumer_claim_min_idle_time(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    consumer = GroupConsumer(redis, stream, group, con, count=10)
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    consumer.consume()
+    consumer.name = uuid()
+
+    for _, messages in consumer.claim_pending(stream, con, min_idle_time=60000):
+        assert messages == []
+
+
+@pytest.mark.n(10)
+def test_group_consumer_autoclaim(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    consumer = GroupConsumer(redis, stream, group, con, count=10)
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    consumer.consume()
+    consumer.name = uuid()
+
+    batch, done = consumer.autoclaim(stream, min_idle_time=60000)
+    assert batch == [[stream, []]]
+    assert done
+
+    batch, done = consumer.autoclaim(stream, min_idle_time=0, count=4)
+    assert [x for _, x in batch[0][1]] == data[:4]
+    assert not done
+
+    res = consumer.steal_pending(con, min_idle_time=0)
+    assert [x for _, x in res[0][1]] == data[4:]
+
+
+@pytest.mark.n(6)
+def test_group_consumer_steal_leaves_live_consumers(redis: StrictRedis, data):
+    stream, group, con, other, dead = uuid(5)
+    consumer = GroupConsumer(redis, stream, group, con, count=2)
+    ids = [redis.xadd(stream, x) for x in data]
+    consumer.consume()  # the first two are this consumer's own
+    redis.xreadgroup(group, other, {stream: ">"}, count=2)  # a live peer
+    redis.xreadgroup(group, dead, {stream: ">"})
+    redis.xdel(stream, ids[5])
+
+    res = consumer.steal_stream(stream, dead, min_idle_time=0)
+    assert [x for _, x in res[0][1]] == data[4:5]
+    assert consumer.steal_stream(stream, dead, min_idle_time=0) == [[stream, []]]
+    pending = convert_bytes(redis.xpending_range(stream, group, "-", "+", 10))
+    owners = {p["message_id"]: p["consumer"] for p in pending}
+    assert [owners[_id] for _id in convert_bytes(ids[:4])] == [con, con, other, other]
+    assert owners[convert_bytes(ids[4])] == con
+    assert consumer.count_pending(dead) == 0  # XCLAIM drops the deleted entry
+
+
+@pytest.mark.n(4)
+def test_group_consumer_autoclaim_own_and_deleted(redis: StrictRedis, data):
+    stream, group, con, other = uuid(4)
+    consumer = GroupConsumer(redis, stream, group, con, count=2)
+    ids = [redis.xadd(stream, x) for x in data]
+    consumer.consume()  # the first two are this consumer's own
+    redis.xreadgroup(group, other, {stream: ">"})
+    redis.xdel(stream, ids[3])
+
+    # an explicit claim of anything idle takes entries of any consumer
+    batch, done = consumer.autoclaim(stream, min_idle_time=0, count=10)
+    assert [x for _, x in batch[0][1]] == data[2:3]
+    assert done
+    pending = convert_bytes(redis.xpending_range(stream, group, "-", "+", 10))
+    assert [p["message_id"] for p in pending] == convert_bytes(ids[:3])
+    assert {p["consumer"] for p in pending} == {con}
+
+
+@pytest.mark.n(10)
+def test_ack_buffer(redis: StrictRedis, data):
+    s1, s2, group, con = uuid(4)
+    consumer = GroupConsumer(redis, [s1, s2], group, con)
+    acks = AckBuffer(redis, group, batch_size=15)
+
+    for x in data:
+        redis.xadd(s1, x)
+        redis.xadd(s2, x)
+
+    res = consumer.consume()
+    full = [acks.add(stream, *[_id for _id, _ in messages]) for stream, messages in res]
+    assert full == [False, True]
+    assert len(acks) == 20
+
+    acks.flush()
+    assert len(acks) == 0
+    for stream in (s1, s2):
+        assert convert_bytes(redis.xpending(stream, group))["pending"] == 0
+
+
+def test_ack_buffer_failed_flush(redis: StrictRedis):
+    key, group = uuid(2)
+    redis.set(key, "not a stream")
+    acks = AckBuffer(redis, group)
+    acks.add(key, "1-0", "2-0")
+
+    with pytest.raises(ResponseError):
+        acks.flush()
+    assert len(acks) == 2  # kept for the next flush
+
+
+def test_adaptive_count():
+    count = AdaptiveCount(2, 16, target_latency=0.1)
+    assert count.value == 2
+
+    for n in (2, 4, 8, 16, 16):  # backlog, replies are full
+        count.received(n)
+    assert count.value == 16
+
+    count.processed(16, 0.4)  # too slow downstream
+    assert count.value == 4
+
+    count.received(1)  # caught up
+    assert count.value == 2
+    count.received(0)
+    assert count.value == 2
+
+
+@pytest.mark.n(20)
+def test_consumer_adaptive_count(redis: StrictRedis, data):
+    stream = uuid()
+    count = AdaptiveCount(1, 8)
+    consumer = Consumer(redis, stream, count=count, default_start_id="0")
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    sizes = [len(just_data(consumer.consume())) for _ in range(4)]
+    assert sizes == [1, 2, 4, 8]
+    assert count.value == 8
+
+
+def test_adaptive_count_many_small_streams(redis: StrictRedis):
+    streams = uuid(4)
+    count = AdaptiveCount(min_count=4, max_count=8)
+    consumer = Consumer(redis, streams, count=count, default_start_id="0")
+    for s in streams:
+        redis.xadd(s, {"a": 1})
+
+    consumer.consume()  # 4 messages, but one per stream: no backlog
+    assert count.value == 4
+
+
+@pytest.mark.n(10)
+def test_group_consumer_read_pending(redis: StrictRedis, data):
+    s1, s2, group, con = uuid(4)
+    consumer = GroupConsumer(redis, [s1, s2], group, con)
+
+    for x in data:
+        redis.xadd(s1, x)
+    for x in data[:3]:
+        redis.xadd(s2, x)
+
+    consumer.consume()
+    assert consumer.count_pending() == 13
+
+    cursors = {s1: "0", s2: "0"}
+    pages = []
+    while cursors:
+        pages.append(consumer.read_pending(cursors, count=4))
+
+    received = {s1: [], s2: []}
+    for page in pages:
+        for stream, messages in page:
+            assert len(messages) <= 4
+            received[stream].extend(x for _, x in messages)
+    assert received == {s1: data, s2: data[:3]}
+    assert len(pages) == 3
+
+
+def claim_all(consumer, stream, dead, members):
+    claimed = []
+    while True:
+        res = consumer.steal_stream(stream, dead, 50, members)
+        if len(res[0][1]) == 0:
+            return claimed
+        claimed.extend(_id for _id, _ in res[0][1])
+
+
+@pytest.mark.n(30)
+def test_group_consumer_claim_partition(redis: StrictRedis, data):
+    stream, group, dead, a, b, c = uuid(6)
+    for x in data:
+        redis.xadd(stream, x)
+    GroupConsumer(redis, stream, group, dead).consume()
+    time.sleep(0.5)  # well over min_idle_time
+
+    members = [a, b, c]
+    claimed = {}
+    for name in [a, b]:  # c dies before claiming its share
+        consumer = GroupConsumer(redis, stream, group, name, count=3)
+        claimed[name] = claim_all(consumer, stream, dead, members)
+
+    assert len(claimed[a]) > 0 and len(claimed[b]) > 0
+    assert set(claimed[a]).isdisjoint(claimed[b])
+    assert GroupConsumer(redis, stream, group, a).count_pending(dead) > 0
+
+    # the next round is split between the members that are left
+    for name in [a, b]:
+        consumer = GroupConsumer(redis, stream, group, name, count=3)
+        claimed[name] += claim_all(consumer, stream, dead, [a, b])
+
+    assert set(claimed[a]).isdisjoint(claimed[b])
+    assert len(claimed[a]) + len(claimed[b]) == len(data)
+    assert GroupConsumer(redis, stream, group, a).count_pending(dead) == 0
+
+
+class OldRedis(StrictRedis):
+    """Replies like Redis < 6.2, which has neither ``IDLE`` in ``XPENDING`` nor
+    ``XAUTOCLAIM``.
+    """
+
+    def xpending_range(self, *args, idle=None, **kwargs):
+        if idle is not None:
+            raise ResponseError(
+                "Invalid stream ID specified as stream command argument"
+            )
+        return super().xpending_range(*args, **kwargs)
+
+
+@pytest.mark.n(10)
+def test_group_consumer_claim_partition_unsupported(redis: StrictRedis, data):
+    stream, group, dead, a, b = uuid(5)
+    for x in data:
+        redis.xadd(stream, x)
+    GroupConsumer(redis, stream, group, dead).consume()
+
+    client = OldRedis(connection_pool=redis.connection_pool)
+    consumer = GroupConsumer(client, stream, group, a)
+    res = consumer.steal_stream(stream, dead, 0, [a, b])
+
+    assert [x for _, x in res[0][1]] == data  # claimed all of them, not a share
+    assert not consumer.use_autoclaim
+
+
+def test_consumer_fields(redis: StrictRedis):
+    stream = uuid()
+    redis.xadd(stream, {"key": "k", "payload": b"\xff"})
+    consumer = Consumer(redis, stream, default_start_id="0", fields=["key"])
+    assert just_data(consumer.consume()) == [{"key": "k", "payload": b"\xff"}]
+
+
+def test_consumer_decode_responses(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    client = StrictRedis(decode_responses=True)
+    consumer = GroupConsumer(client, stream, group, con)
+    assert not consumer.convert
+
+    for x in data:
+        redis.xadd(stream, x)
+    res = consumer.consume()
+    assert res[0][0] == stream
+    assert just_data(res) == data
+
+
+def test_stream_reply_parser():
+    raw = [[b"s", [[b"1-0", [b"a", b"x", b"b", b"\xff"]], [b"2-0", None]]]]
+    assert StreamReplyParser(fields=["a"]).streams(raw) == [
+        ["s", [("1-0", {"a": "x", "b": b"\xff"}), ("2-0", None)]]
+    ]
+    assert StreamReplyParser(lazy=True).streams(raw) == [
+        ["s", [("1-0", {b"a": b"x", b"b": b"\xff"}), ("2-0", None)]]
+    ]
+    assert StreamReplyParser(convert=False).claimed(raw[0][1]) == [
+        (b"1-0", {b"a": b"x", b"b": b"\xff"}),
+        (b"2-0", None),
+    ]
+    assert StreamReplyParser().streams(None) == []
+
+
+@pytest.mark.n(10)
+@pytest.mark.usefixtures("redis")
+def test_group_consumer_parse_replies(data):
+    stream, group, con = uuid(3)
+    client = StrictRedis()
+    consumer = GroupConsumer(client, stream, group, con, parse_replies=True)
+
+    for x in data:
+        client.xadd(stream, x)
+
+    res = consumer.consume()
+    assert res[0][0] == stream
+    assert just_data(res) == data
+    assert just_data(consumer.consume(pending=True)) == data
+
+    consumer.name = uuid()
+    assert just_data(consumer.claim_pending(stream, con, 0)) == data
+
+
+def test_consumer_positions(redis: StrictRedis):
+    stream = uuid()
+    for i in (9, 10, 11):
+        redis.xadd(stream, {"i": i}, id=f"{i}-0")
+    consumer = Consumer(redis, stream, count=2, default_start_id="0")
+
+    assert just_data(consumer.consume()) == [{"i": "9"}, {"i": "10"}]
+    assert consumer.streams[stream] == "10-0"
+    assert consumer.positions[stream] == StreamID(10, 0)
+    assert just_data(consumer.consume()) == [{"i": "11"}]
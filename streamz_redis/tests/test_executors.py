@@ -0,0 +1,99 @@
+from threading import Event
+
+from redis import StrictRedis
+from streamz import Stream
+from streamz.utils_test import wait_for
+from streamz_redis.executors import ReaderExecutor
+from streamz_redis.sources import from_redis_lists
+from streamz_redis.tests import uuid
+
+Stream.register_api(staticmethod)(from_redis_lists)
+
+
+def test_register():
+    pool = ReaderExecutor(spare=2)
+    assert pool.stats["max_workers"] == 2
+
+    pool.register()
+    pool.register()
+    assert pool.stats["readers"] == 2
+    assert pool.stats["max_workers"] == 4
+
+    pool.unregister()
+    assert pool.stats["max_workers"] == 3
+    pool.shutdown()
+
+
+def test_stats():
+    pool = ReaderExecutor(spare=1)
+    started, release = Event(), Event()
+
+    def block():
+        started.set()
+        release.wait()
+
+    pool.submit(block)
+    started.wait(1)
+    pool.submit(lambda: None)
+
+    stats = pool.stats
+    assert stats["active"] == 1
+    assert stats["queued"] == 1
+
+    release.set()
+    wait_for(lambda: pool.stats["active"] == 0, 1)
+    pool.shutdown()
+
+
+def test_shared_between_sources(redis: StrictRedis):
+    keys = uuid(5)
+    pool = ReaderExecutor(spare=0)
+    out = Stream()
+    L = out.pluck(1).map(int).sink_to_list()
+
+    sources = []
+    for key in keys:
+        source = Stream.from_redis_lists(key, timeout=0, executor=pool)
+        source.connect(out)
+        source.start()
+        sources.append(source)
+
+    wait_for(lambda: pool.stats["active"] == 5, 2)
+    for i, key in enumerate(keys):
+        redis.rpush(key, i)
+
+    wait_for(lambda: sorted(L) == list(range(5)), 2)
+    for source in sources:
+        source.stop()
+    for key in keys:  # unblock the readers
+        redis.rpush(key, -1)
+
+
+def test_unregister_on_stop(redis: StrictRedis):
+    keys = uuid(2)
+    pool = ReaderExecutor(spare=0)
+    sources = [Stream.from_redis_lists(k, timeout=0, executor=pool) for k in keys]
+    for source in sources:
+        source.start()
+    wait_for(lambda: pool.stats["active"] == 2, 2)
+    assert pool.stats["readers"] == 2
+
+    sources[0].stop()
+    sources[0].stop()
+    assert pool.stats["readers"] == 1
+    redis.rpush(keys[0], -1)  # unblock the reader, its thread then exits
+    wait_for(lambda: pool.stats["threads"] == 1, 2)
+
+    sources[1].stop()
+    redis.rpush(keys[1], -1)
+
+
+def test_destroy_shuts_down_own_executor(redis: StrictRedis):
+    source = Stream.from_redis_lists(uuid(), timeout=1)
+    executor = source._executor
+    source.start()
+    wait_for(lambda: executor.stats["active"] == 1, 2)
+
+    source.destroy()
+    assert executor.stats["readers"] == 0
+    wait_for(lambda: executor.stats["threads"] == 0, 3)
@@ -4,10 +4,14 @@ import pytest
 from redis import StrictRedis
 from streamz import Stream
 from streamz.utils_test import wait_for
+from streamz_redis.pools import get_pool
 from streamz_redis.sinks import sink_to_redis_list
 from streamz_redis.sources import from_redis_consumer_group
-from streamz_redis.sources.consumers import convert_bytes
+from streamz_redis.sources.consumers import GroupConsumer, convert_bytes
 from streamz_redis.tests import uuid
+from streamz_redis.workers import Autoscaler
+from tornado import gen
+from tornado.locks import Semaphore
 from tornado.queues import Queue
 
 Stream.register_api(staticmethod)(from_redis_consumer_group)
@@ -31,6 +35,138 @@ def test_ack(redis: StrictRedis, data):
 
     source.stop()
 
+    # only XREADGROUP goes through the dedicated pool, acks use the shared one
+    assert source._consumer.commands.connection_pool is get_pool()
+    assert source._consumer.client.connection_pool is not get_pool()
+
+
+@pytest.mark.n(10)
+def test_emit_batches(redis: StrictRedis, data):
+    stream1, stream2, group, con = uuid(4)
+    source = Stream.from_redis_consumer_group(
+        [stream1, stream2], group, con, timeout=0.1, emit_batches=True
+    )
+    batches = source.sink_to_list()
+
+    for x in data:
+        redis.xadd(stream1, x)
+        redis.xadd(stream2, x)
+
+    source.start()
+
+    wait_for(lambda: sum(len(b) for b in batches) == 20, 3)
+    assert len(batches) < 20
+
+    def acked():
+        return all(
+            convert_bytes(redis.xpending(s, group))["pending"] == 0
+            for s in (stream1, stream2)
+        )
+
+    wait_for(acked, 1)
+    source.stop()
+
+
+@pytest.mark.n(10)
+def test_ack_interval(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, ack_batch_size=100, ack_interval=0.05
+    )
+    L = source.sink_to_list()
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    source.start()
+
+    wait_for(lambda: len(L) == 10, 3)
+    wait_for(lambda: convert_bytes(redis.xpending(stream, group))["pending"] == 0, 1)
+    source.stop()
+
+
+@pytest.mark.n(10)
+def test_ack_flush_on_stop(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, ack_batch_size=100
+    )
+    L = source.sink_to_list()
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    source.start()
+
+    wait_for(lambda: len(L) == 10, 3)
+    sleep(0.05)  # wait for the last ack callback
+    assert convert_bytes(redis.xpending(stream, group))["pending"] == 10
+    source.stop()
+    assert convert_bytes(redis.xpending(stream, group))["pending"] == 0
+
+
+@pytest.mark.n(10)
+def test_ack_batch_size_flushes_while_running(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, ack_batch_size=100
+    )
+    source.sink_to_list()
+    redis.xgroup_create(stream, group, 0, mkstream=True)
+    for x in data:
+        redis.xadd(stream, x)
+    source.start()
+
+    # the buffer isn't full, it's flushed after the default ack_interval
+    wait_for(lambda: convert_bytes(redis.xpending(stream, group))["pending"] == 0, 3)
+    source.stop()
+
+
+@pytest.mark.n(10)
+def test_prefetch(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, count=1, timeout=0.1, prefetch=3
+    )
+    processed = []
+    source.rate_limit(0.05).sink(processed.append)
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    source.start()
+
+    def delivered():
+        return convert_bytes(redis.xpending(stream, group))["pending"]
+
+    wait_for(lambda: len(processed) >= 1, 2)
+    wait_for(lambda: delivered() > len(processed), 1)  # reads ahead
+    assert delivered() - len(processed) <= 3 + 2  # queue + emitting + reading
+
+    wait_for(lambda: len(processed) == 10, 3)
+    assert [x[2] for x in processed] == data
+    wait_for(lambda: delivered() == 0, 1)
+    source.stop()
+
+
+def test_prefetch_read_error(redis: StrictRedis, data, caplog):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, count=1, timeout=0.1, prefetch=3
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    for x in data:
+        redis.xadd(stream, x)
+    wait_for(lambda: len(L) == 3, 2)
+
+    redis.xgroup_destroy(stream, group)  # the next read fails with NOGROUP
+
+    wait_for(lambda: source.stopped, 2)
+    wait_for(lambda: "NOGROUP" in caplog.text, 1)
+    source.stop()
+
 
 @pytest.mark.n(10)
 def test_replay(redis: StrictRedis, data):
@@ -61,6 +197,26 @@ def test_replay(redis: StrictRedis, data):
     source.stop()
 
 
+@pytest.mark.n(10)
+def test_replay_pages(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    redis.xgroup_create(stream, group, mkstream=True)
+    for x in data:
+        redis.xadd(stream, x)
+    redis.xreadgroup(group, con, {stream: ">"})  # all messages are pending now
+
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, replay_count=3
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    wait_for(lambda: len(L) == 10, 3)
+    assert [x[2] for x in L] == data
+    assert source.replay_progress == {"replayed": 10, "pending": 10}
+    source.stop()
+
+
 @pytest.mark.n(50)
 def test_multiple_consumers(redis: StrictRedis, data):
     out = Stream().pluck(2)
@@ -148,3 +304,165 @@ def test_claim(redis: StrictRedis, data):
     )
 
     source.stop()
+
+
+@pytest.mark.n(25)
+def test_loot_stream(redis: StrictRedis, data):
+    stream, group, dead1, dead2 = uuid(4)
+    GroupConsumer(redis, stream, group, dead1)
+    for x in data:
+        redis.xadd(stream, x)
+    # never acked, looted for both dead consumers at the same time
+    redis.xreadgroup(group, dead1, {stream: ">"}, count=5)
+    redis.xreadgroup(group, dead2, {stream: ">"})
+
+    source = Stream.from_redis_consumer_group(
+        stream,
+        group,
+        uuid(),
+        count=2,
+        heartbeat_interval=0.1,
+        claim_timeout=0.3,
+        partition_claims=False,
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    wait_for(lambda: len(L) == len(data), 5, period=0.1)
+    assert sorted(x[2]["i"] for x in L) == sorted(x["i"] for x in data)
+    wait_for(lambda: convert_bytes(redis.xpending(stream, group))["pending"] == 0, 1)
+    source.stop()
+
+
+@pytest.mark.n(20)
+def test_workers(redis: StrictRedis, data):
+    stream, group, con, target = uuid(4)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, count=1, workers=2, restart_delay=0.1
+    )
+    source.pluck(2).pluck("i").sink_to_redis_list(target)
+    source.start()
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    wait_for(lambda: redis.llen(target) == 20, 10, period=0.1)
+    assert sorted(int(x) for x in redis.lrange(target, 0, -1)) == list(range(20))
+    consumers = convert_bytes(redis.xinfo_consumers(stream, group))
+    assert sorted(c["name"] for c in consumers) == [f"{con}-0", f"{con}-1"]
+    wait_for(lambda: convert_bytes(redis.xpending(stream, group))["pending"] == 0, 3)
+
+    supervisor = source._supervisor
+    supervisor.processes[0].kill()
+    wait_for(lambda: supervisor.restarts == 1 and supervisor.alive == 2, 5)
+
+    source.stop()
+    assert supervisor.alive == 0
+    assert [p.exitcode for p in supervisor.processes.values()] == [0, 0]
+
+
+@pytest.mark.n(20)
+def test_drain(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, count=1, prefetch=2, ack_batch_size=100
+    )
+    gate = Semaphore(0)
+    L = []
+
+    @gen.coroutine
+    def process(x):
+        yield gate.acquire()
+        L.append(x)
+
+    source.sink(process)
+
+    redis.xgroup_create(stream, group, 0, mkstream=True)
+    for x in data:
+        redis.xadd(stream, x)
+
+    def pending():
+        return convert_bytes(redis.xpending(stream, group))["pending"]
+
+    source.start()
+    # one message is held by the gate, two are queued, one waits to be queued
+    wait_for(lambda: pending() == 4, 3)
+
+    def release():
+        for _ in data:
+            gate.release()
+
+    source.loop.add_callback(source.drain, 5)
+    source.loop.add_callback(release)
+    wait_for(lambda: source.stopped, 3)
+
+    assert [x[2] for x in L] == data[:4]
+    assert pending() == 0
+    redis.xadd(stream, {"i": 20})
+    sleep(0.3)
+    assert len(L) == 4
+
+
+@pytest.mark.n(20)
+def test_autoscaler(redis: StrictRedis, data):
+    stream, group, con, target = uuid(4)
+    with pytest.raises(ValueError):
+        from_redis_consumer_group(stream, group, con, autoscale={})
+
+    source = Stream.from_redis_consumer_group(
+        stream, group, con, timeout=0.1, count=1, workers=1, restart_delay=0.1
+    )
+    source.pluck(2).pluck("i").sink_to_redis_list(target)
+    supervisor = source._supervisor
+    scaler = Autoscaler(
+        supervisor,
+        [stream],
+        group,
+        con,
+        max_workers=2,
+        scale_up_at=5,
+        scale_down_at=1,
+        up_cooldown=0,
+        down_cooldown=10,
+    )
+    redis.xgroup_create(stream, group, 0, mkstream=True)
+    for x in data:
+        redis.xadd(stream, x)
+
+    assert scaler.measure() == {"lag": 20, "pending": 0}
+    assert scaler.check(now=0) == 1
+    assert scaler.check(now=1) == 0  # at max_workers
+    assert supervisor.workers == 2
+
+    source.start()
+    wait_for(lambda: redis.llen(target) == 20, 10, period=0.1)
+    wait_for(lambda: supervisor.alive == 2, 5)
+    wait_for(lambda: scaler.measure() == {"lag": 0, "pending": 0}, 3)
+    consumers = convert_bytes(redis.xinfo_consumers(stream, group))
+    assert sorted(c["name"] for c in consumers) == [f"{con}-0", f"{con}-1"]
+
+    assert scaler.check(now=2) == 0  # cooling down
+    assert scaler.check(now=20) == -1
+    assert supervisor.workers == 1
+    assert scaler.retired == {1}
+
+    wait_for(lambda: len(supervisor.retiring) == 0, 5, period=0.1)
+    scaler.delete_retired()
+    assert scaler.retired == set()
+    consumers = convert_bytes(redis.xinfo_consumers(stream, group))
+    assert [c["name"] for c in consumers] == [f"{con}-0"]
+    assert supervisor.alive == 1
+
+    source.stop()
+
+
+@pytest.mark.n(5)
+def test_autoscaler_lag_fallback(redis: StrictRedis, data):
+    stream, group, con = uuid(3)
+    ids = [redis.xadd(stream, x) for x in data]
+    redis.xgroup_create(stream, group, 0)
+    redis.xreadgroup(group, con, {stream: ">"}, count=1)
+    redis.xdel(stream, ids[3])  # Redis can't tell the lag after a deletion
+
+    scaler = Autoscaler(None, [stream], group, con)
+    assert scaler.measure() == {"lag": 3, "pending": 1}
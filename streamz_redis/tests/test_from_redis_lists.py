@@ -1,6 +1,7 @@
 from redis import StrictRedis
 from streamz import Stream
 from streamz.utils_test import wait_for
+from streamz_redis.pools import pool_stats
 from streamz_redis.sources.from_redis_lists import from_redis_lists
 from streamz_redis.tests import uuid
 
@@ -31,3 +32,20 @@ def test_multiple(redis: StrictRedis):
 
     wait_for(lambda: len(L) == 6, 2)
     source.stop()
+
+
+def test_asyncio_engine(redis: StrictRedis):
+    l1, l2 = uuid(2)
+
+    source = Stream.from_redis_lists([l1, l2], timeout=0.1, engine="asyncio")
+    L = source.pluck(1).map(int).sink_to_list()
+    source.start()
+
+    redis.rpush(l1, *list(range(3)))
+    redis.rpush(l2, *list(range(3)))
+
+    wait_for(lambda: len(L) == 6, 2)
+    dedicated = pool_stats()["localhost:6379/0"]["dedicated"]
+    source.stop()
+    # the client is closed once the pending read times out
+    wait_for(lambda: pool_stats()["localhost:6379/0"]["dedicated"] < dedicated, 1)
@@ -1,6 +1,9 @@
+import pytest
 from redis import StrictRedis
 from streamz import Stream
 from streamz.utils_test import wait_for
+from streamz_redis.checkpoints import CheckpointStore, FileCheckpointStore
+from streamz_redis.messages import StreamMessage
 from streamz_redis.sources.from_redis_streams import from_redis_streams
 from streamz_redis.tests import uuid
 
@@ -38,3 +41,164 @@ def test_multiple(redis: StrictRedis, data):
     assert L1 == [stream1] * 3
     assert L2 == [stream2] * 3
     source.stop()
+
+
+def test_asyncio_engine(redis: StrictRedis, data):
+    stream = uuid()
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, engine="asyncio"
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    for x in data:
+        redis.xadd(stream, x)
+
+    wait_for(lambda: len(L) == 3, 2)
+    assert [x[2] for x in L] == data
+    source.stop()
+
+
+@pytest.mark.n(10)
+def test_emit_batches(redis: StrictRedis, data):
+    stream = uuid()
+    for x in data:
+        redis.xadd(stream, x)
+
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, emit_batches=True
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    wait_for(lambda: len(L) == 1, 2)
+    assert [x[2] for x in L[0]] == data
+    source.stop()
+
+
+def test_encoding(redis: StrictRedis):
+    stream = uuid()
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, encoding="cp1252"
+    )
+    L = source.pluck(2).sink_to_list()
+    redis.xadd(stream, {"x": "é".encode("cp1252")})
+    source.start()
+
+    wait_for(lambda: len(L) == 1, 2)
+    assert L == [{"x": "é"}]
+    source.stop()
+
+
+def test_lazy(redis: StrictRedis, data):
+    stream = uuid()
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, lazy=True
+    )
+    L = source.sink_to_list()
+    for x in data:
+        redis.xadd(stream, x)
+    source.start()
+
+    wait_for(lambda: len(L) == 3, 2)
+    assert all(isinstance(m, StreamMessage) for m in L)
+    assert [m.raw for m in L] == [
+        {k.encode(): v.encode() for k, v in x.items()} for x in data
+    ]
+    assert [x for _, _, x in L] == data
+    source.stop()
+
+    with pytest.raises(ValueError):
+        Stream.from_redis_streams(stream, lazy=True, convert=False)
+    with pytest.raises(ValueError):
+        Stream.from_redis_streams(stream, lazy=True, fields=["i"])
+
+
+@pytest.mark.n(10)
+def test_schema(redis: StrictRedis, data):
+    np = pytest.importorskip("numpy")
+    stream = uuid()
+    for x in data:
+        redis.xadd(stream, x)
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, schema={"i": np.int64}
+    )
+    L = source.sink_to_list()
+    source.start()
+
+    wait_for(lambda: len(L) == 1, 2)
+    assert L[0]["i"].tolist() == list(range(10))
+    assert L[0]["stream"].tolist() == [stream] * 10
+    source.stop()
+
+
+def test_parse_replies(redis: StrictRedis, data):
+    stream = uuid()
+    source = Stream.from_redis_streams(
+        stream, timeout=0.1, default_start_id=0, parse_replies=True
+    )
+    L = source.sink_to_list()
+    for x in data:
+        redis.xadd(stream, x)
+    source.start()
+
+    wait_for(lambda: len(L) == 3, 2)
+    assert [x for _, _, x in L] == data
+    source.stop()
+
+
+@pytest.mark.n(10)
+def test_checkpoint(redis: StrictRedis, data, tmp_path):
+    stream = uuid()
+    store = FileCheckpointStore(str(tmp_path / "positions.json"))
+
+    def run(expected):
+        source = Stream.from_redis_streams(
+            stream,
+            timeout=0.1,
+            default_start_id=0,
+            checkpoint=store,
+            checkpoint_every=4,
+            checkpoint_interval=0.05,
+        )
+        L = source.pluck(2).sink_to_list()
+        source.start()
+        last = redis.xinfo_stream(stream)["last-generated-id"].decode()
+        wait_for(lambda: store.load([stream]).get(stream) == last, 2)
+        source.stop()
+        assert L == expected
+
+    for x in data[:5]:
+        redis.xadd(stream, x)
+    run(data[:5])
+
+    for x in data[5:]:
+        redis.xadd(stream, x)
+    run(data[5:])  # resumes after the saved position
+
+
+class FailingStore(CheckpointStore):
+    def load(self, streams):
+        return {}
+
+    def save(self, positions):
+        raise OSError("disk full")
+
+
+def test_checkpoint_save_fails(redis: StrictRedis, data, caplog):
+    stream = uuid()
+    source = Stream.from_redis_streams(
+        stream,
+        timeout=0.1,
+        default_start_id=0,
+        checkpoint=FailingStore(),
+        checkpoint_interval=0.05,
+    )
+    source.sink(lambda x: None)
+    for x in data:
+        redis.xadd(stream, x)
+    source.start()
+
+    wait_for(lambda: "Failed to save checkpoint" in caplog.text, 2)
+    with pytest.raises(OSError):
+        source.stop()
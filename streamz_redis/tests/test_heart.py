@@ -1,8 +1,10 @@
+import time
+
 import pytest
 from redis import StrictRedis
 from streamz.utils_test import wait_for
 from streamz_redis.sources.consumers import GroupConsumer
-from streamz_redis.sources.heart import Heart
+from streamz_redis.sources.heart import Heart, get_service
 from streamz_redis.tests import uuid
 
 
@@ -59,3 +61,75 @@ def test_heartbeats(redis: StrictRedis):
 
     for h in hearts:
         h.stop()
+
+
+def test_shared_service(redis: StrictRedis):
+    stream, group = uuid(2)
+    redis.xgroup_create(stream, group, mkstream=True)
+
+    hearts = [Heart(stream, group, uuid(), interval=0.1) for _ in range(3)]
+    for h in hearts:
+        h.start()
+
+    service = get_service()
+    assert all(h.service is service for h in hearts)
+    assert set(service.hearts) == {(group, h.name) for h in hearts}
+
+    wait_for(lambda: all(h.last_heartbeat is not None for h in hearts), 5)
+    wait_for(lambda: all(len(h.seen) == 2 for h in hearts), 5)
+    assert all(h.is_alive() for h in hearts)
+
+    for h in hearts:
+        h.stop()
+    assert not any(h.is_alive() for h in hearts)
+    wait_for(lambda: service._thread is None, 5)
+
+    heart = Heart(stream, group, uuid(), interval=0.1)
+    heart.start()  # the service thread starts again
+    wait_for(lambda: heart.last_heartbeat is not None, 5)
+    heart.stop()
+
+
+def test_service_survives_errors(redis: StrictRedis):
+    stream, group = uuid(2)
+    redis.xgroup_create(stream, group, mkstream=True)
+
+    # XPENDING of a missing group fails on every check
+    broken = Heart(uuid(), uuid(), uuid(), interval=0.1)
+    broken.start()
+    heart = Heart(stream, group, uuid(), interval=0.1)
+    heart.start()
+
+    service = get_service()
+    wait_for(lambda: broken.last_sent is not None, 5)
+    sent = broken.last_sent
+    wait_for(lambda: broken.last_sent > sent, 5)  # still ticking after a failure
+    wait_for(lambda: heart.last_heartbeat is not None, 5)
+    assert service._thread is not None and service._thread.is_alive()
+    assert heart.is_alive()
+
+    broken.stop()
+    heart.stop()
+
+
+@pytest.mark.n(10)
+def test_registry_check_dead(redis: StrictRedis, data):
+    stream, group, dead, gone, alive = uuid(5)
+    heart = Heart(stream, group, alive, timeout=1, liveness="registry")
+    heart.redis = redis
+
+    for x in data:
+        redis.xadd(stream, x)
+    GroupConsumer(redis, stream, group, dead).consume()
+
+    now = time.time()
+    redis.zadd(heart.registry_key, {dead: now - 5, gone: now - 5, alive: now})
+    heart.check_dead()
+    heart.check_dead()
+
+    con, last, members = heart.dead.get(timeout=1)
+    assert con == dead
+    assert last == now - 5
+    assert members == [alive]
+    assert heart.dead.empty()  # reported once
+    assert redis.zrange(heart.registry_key, 0, -1) == [dead.encode(), alive.encode()]
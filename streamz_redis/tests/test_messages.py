@@ -0,0 +1,52 @@
+import pytest
+from streamz_redis.messages import StreamID, StreamMessage
+
+
+def test_unpack():
+    m = StreamMessage("s", "1600000000000-3", {b"a": b"x", b"b": b"y"})
+    stream, _id, data = m
+    assert (stream, _id, data) == ("s", "1600000000000-3", {"a": "x", "b": "y"})
+    assert m[0] == "s" and m[-1] == data
+    assert m == ("s", "1600000000000-3", {"a": "x", "b": "y"})
+    assert len(m) == 3
+    assert (m.ts, m.seq) == (1600000000000, 3)
+
+
+def test_lazy_fields():
+    m = StreamMessage("s", "1-0", {b"a": b"x", b"b": b"\xff"})
+    assert m["a"] == "x"
+    assert m.get("c", 1) == 1
+    assert "b" in m and "c" not in m
+    assert m.raw[b"b"] == b"\xff"  # not decoded
+    with pytest.raises(KeyError):
+        m["c"]
+
+
+def test_decoded_raw():
+    m = StreamMessage("s", "1-0", {"a": "x"})
+    assert m["a"] == "x"
+    assert m.data == {"a": "x"}
+
+
+def test_deleted():
+    m = StreamMessage("s", "1-0", None)
+    assert m.data is None
+    assert m.get("a") is None
+
+
+def test_hash():
+    m = StreamMessage("s", "1-0", None)
+    assert m == ("s", "1-0", None)
+    assert hash(m) == hash(("s", "1-0", None))
+    with pytest.raises(TypeError):  # like a tuple holding a dict
+        hash(StreamMessage("s", "1-0", {b"a": b"x"}))
+
+
+def test_stream_id():
+    assert StreamID.parse("9-0") < StreamID.parse(b"10-0")
+    assert StreamID.parse("5") == StreamID(5, 0)
+    assert StreamID.parse(StreamID(1, 2)) == (1, 2)
+    assert str(StreamID(10, 3)) == "10-3"
+    assert StreamID(10, 3).next() == StreamID(10, 4)
+    with pytest.raises(ValueError):
+        StreamID.parse("$")
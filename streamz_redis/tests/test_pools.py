@@ -0,0 +1,54 @@
+import multiprocessing
+import os
+
+import pytest
+from streamz import Stream
+from streamz_redis import pools
+from streamz_redis.pools import get_blocking_client, get_client, get_pool, pool_stats
+from streamz_redis.sinks import sink_to_redis_list
+from streamz_redis.tests import uuid
+
+Stream.register_api()(sink_to_redis_list)
+
+
+def test_shared_pool():
+    assert get_pool() is get_pool({"host": "localhost", "port": 6379})
+    assert get_pool() is not get_pool({"db": 1})
+    assert get_client().connection_pool is get_pool()
+
+
+def test_blocking_client_is_dedicated():
+    c1, c2 = get_blocking_client(), get_blocking_client()
+    assert c1.connection_pool is not c2.connection_pool
+    assert c1.connection_pool is not get_pool()
+
+
+@pytest.mark.usefixtures("redis")
+def test_sinks_share_pool():
+    source = Stream()
+    sinks = [source.sink_to_redis_list(uuid()) for _ in range(10)]
+    created = len(get_pool()._connections)
+
+    for i in range(10):
+        source.emit(i)
+
+    assert len({s._redis.connection_pool for s in sinks}) == 1
+    assert pool_stats()["localhost:6379/0"]["created"] - created <= 1
+
+
+@pytest.mark.usefixtures("redis")
+def test_pool_stats():
+    client = get_blocking_client()
+    client.ping()
+    stats = pool_stats()["localhost:6379/0"]
+    assert stats["dedicated"] >= 1
+    assert stats["in_use"] == 0
+
+
+@pytest.mark.skipif(not hasattr(os, "register_at_fork"), reason="needs fork")
+def test_lock_reset_after_fork():
+    with pools._lock:  # as if another thread held it while a worker is forked
+        p = multiprocessing.get_context("fork").Process(target=get_pool, args=({},))
+        p.start()
+    p.join(5)
+    assert p.exitcode == 0
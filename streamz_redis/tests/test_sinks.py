@@ -1,8 +1,17 @@
+from threading import current_thread
+from time import sleep
+
 import pytest
 from redis import StrictRedis
+from redis.exceptions import ResponseError
 from streamz import Stream
+from streamz.core import RefCounter, sync
+from streamz.utils_test import wait_for
 from streamz_redis.sinks import sink_to_redis_list, sink_to_redis_stream
+from streamz_redis.sources.base import create_metadata
+from streamz_redis.sources.consumers import convert_bytes
 from streamz_redis.tests import uuid
+from tornado import gen
 
 Stream.register_api()(sink_to_redis_list)
 Stream.register_api()(sink_to_redis_stream)
@@ -55,3 +64,197 @@ def test_stream_maxlen(redis: StrictRedis, data):
         source.emit(x)
 
     assert redis.xlen(key) == 10
+
+
+@pytest.mark.n(25)
+def test_stream_batch_size(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_stream(key, batch_size=10)
+
+    for x in data:
+        source.emit(x)
+
+    assert redis.xlen(key) == 20
+    sink.stop()
+    assert redis.xlen(key) == 25
+
+
+@pytest.mark.n(50)
+def test_stream_batch_maxlen(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream()
+    source.sink_to_redis_stream(key, maxlen=10, approximate=False, batch_size=7)
+
+    for x in data:
+        source.emit(x)
+
+    assert redis.xlen(key) == 10
+
+
+def test_stream_flush_interval(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream()
+    source.sink_to_redis_stream(key, flush_interval=0.05)
+
+    for x in data:
+        source.emit(x)
+
+    wait_for(lambda: redis.xlen(key) == 3, 2, period=0.05)
+
+
+def test_stream_flush_on_destroy(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_stream(key, batch_size=100)
+
+    for x in data:
+        source.emit(x)
+
+    assert redis.xlen(key) == 0
+    sink.destroy()
+    assert redis.xlen(key) == 3
+
+
+def test_failed_flush_keeps_buffer(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_list(key, batch_size=3)
+    redis.set(key, "not a list")
+
+    source.emit(0)
+    source.emit(1)
+    with pytest.raises(ResponseError):
+        source.emit(2)
+
+    redis.delete(key)
+    source.emit(3)
+    sink.flush()
+    assert [int(x) for x in redis.lrange(key, 0, -1)] == [0, 1, 2, 3]
+
+
+def test_list_unpack(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    source.partition(4).sink_to_redis_list(key, unpack=True, max_args=3)
+
+    for i in range(8):
+        source.emit(i)
+
+    assert [int(x) for x in redis.lrange(key, 0, -1)] == list(range(8))
+
+
+def test_list_unpack_left(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    source.sink_to_redis_list(key, right=False, unpack=True)
+
+    source.emit([0, 1, 2])
+    source.emit(())
+
+    assert [int(x) for x in redis.lrange(key, 0, -1)] == [2, 1, 0]
+
+
+def test_list_batch_size(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_list(key, batch_size=4, max_args=3)
+
+    for i in range(10):
+        source.emit(i)
+
+    assert redis.llen(key) == 8
+    sink.stop()
+    assert [int(x) for x in redis.lrange(key, 0, -1)] == list(range(10))
+
+
+@pytest.mark.n(20)
+def test_stream_max_inflight(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_stream(key, max_inflight=2)
+
+    for x in data:
+        source.emit(x)
+
+    sink.stop()
+    assert [convert_bytes(x) for _, x in redis.xrange(key)] == data
+
+
+def test_max_inflight_backpressure(redis: StrictRedis, data):
+    key = uuid()
+    source = Stream(asynchronous=True)
+    sink = source.sink_to_redis_list(key, max_inflight=1)
+
+    @gen.coroutine
+    def run():
+        for i in range(10):
+            yield source.emit(i)
+            assert len(sink._inflight) <= 1
+
+    sync(source.loop, run)
+    sink.stop()
+    assert [int(x) for x in redis.lrange(key, 0, -1)] == list(range(10))
+
+
+def test_max_inflight_raises_failed_write(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    source.sink_to_redis_list(key, max_inflight=2)
+    redis.set(key, "not a list")
+
+    with pytest.raises(ResponseError):
+        source.emit(0)  # fails in the executor
+        sleep(0.1)
+        source.emit(1)
+
+
+def test_batch_releases_refs_after_flush(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_list(key, batch_size=3)
+    released = []
+
+    for i in range(2):
+        source.emit(i, metadata=create_metadata(lambda i=i: released.append(i)))
+
+    sleep(0.05)
+    assert redis.llen(key) == 0
+    assert released == []
+    sink.stop()
+    wait_for(lambda: sorted(released) == [0, 1], 1)
+    assert redis.llen(key) == 2
+
+
+def test_max_inflight_releases_refs_after_write(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_list(key, max_inflight=5)
+    released = []
+
+    for i in range(5):
+        source.emit(i, metadata=create_metadata(lambda i=i: released.append(i)))
+
+    sink.stop()
+    wait_for(lambda: sorted(released) == list(range(5)), 1)
+
+
+def test_max_inflight_releases_refs_on_loop(redis: StrictRedis):
+    key = uuid()
+    source = Stream()
+    sink = source.sink_to_redis_list(key, max_inflight=5)
+    threads = []
+
+    class Ref(RefCounter):
+        def release(self, n=1):
+            if self.count == n:  # the last reference
+                threads.append(current_thread())
+            super().release(n)
+
+    for i in range(5):
+        source.emit(i, metadata=[{"ref": Ref()}])
+
+    sink.stop()
+    wait_for(lambda: len(threads) == 5, 1)
+    loop_thread = sync(sink.loop, gen.coroutine(current_thread))
+    assert set(threads) == {loop_thread}
@@ -0,0 +1,448 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from threading import Event, Lock, Thread
+
+from tornado import gen
+from tornado.ioloop import IOLoop
+
+from streamz_redis.messages import StreamID
+from streamz_redis.pools import get_client
+from streamz_redis.sinks import RedisSink
+
+logger = logging.getLogger(__name__)
+
+# SIGTERM stops a worker, SIGUSR1 retires it
+_SIGNALS = {signal.SIGTERM, signal.SIGUSR1}
+
+
+def worker_name(name: str, index: int) -> str:
+    """Consumer name of worker number ``index`` of a source named ``name``."""
+    return f"{name}-{index}"
+
+
+def _str(x):
+    return x.decode() if isinstance(x, bytes) else x
+
+
+def _graph(node) -> list:
+    """All nodes connected to ``node``, upstream or downstream."""
+    seen = {id(node): node}
+    todo = [node]
+    while todo:
+        current = todo.pop()
+        for other in list(current.upstreams) + list(current.downstreams):
+            if other is not None and id(other) not in seen:
+                seen[id(other)] = other
+                todo.append(other)
+    return list(seen.values())
+
+
+class Supervisor:
+    """Runs a source together with its whole pipeline in a number of worker
+    processes, and restarts workers that exit.
+
+    Workers are forked from a supervising thread, so they inherit the pipeline as it
+    was declared, lambdas included; this requires the ``fork`` start method (Linux,
+    macOS). Module-level locks of this package are reset in the forked process, in
+    case another thread held them. Each worker calls ``setup(index)``, gives the
+    pipeline a fresh event loop, starts the source and runs the loop until it's
+    stopped with ``SIGTERM``, at which point the source and Redis sinks are stopped,
+    so that buffered writes and acknowledgements aren't lost. Threads of the parent
+    don't exist in a worker, so ``setup`` should replace whatever relies on them,
+    e.g. executors.
+
+    The number of workers can be changed while they run with ``.add_worker()`` and
+    ``.retire_worker()``. A retired worker gets ``SIGUSR1``: if the source has a
+    ``.drain()`` coroutine, it's awaited first, so that the worker finishes the
+    messages it already has, then the worker stops as with ``SIGTERM``.
+
+    Parameters
+    ----------
+    source: streamz.Source
+        The source to run in workers. It shouldn't be started in this process.
+    workers: int
+        Number of worker processes.
+    setup: callable
+        Called with the worker index in each worker process, before the source is
+        started. Defaults to ``None``.
+    restart_delay: int or float
+        Number of seconds between checks for exited workers. Defaults to 1.
+    stop_timeout: int or float
+        Number of seconds to wait for workers to stop gracefully before killing
+        them. Defaults to 10.
+    """
+
+    def __init__(
+        self,
+        source,
+        workers: int,
+        setup=None,
+        restart_delay: float = 1,
+        stop_timeout: float = 10,
+    ):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.source = source
+        self.workers = workers
+        self.setup = setup
+        self.restart_delay = restart_delay
+        self.stop_timeout = stop_timeout
+        self.processes = {}
+        self.restarts = 0
+        self._retiring = {}
+        self._context = multiprocessing.get_context("fork")
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread = None
+
+    def start(self):
+        """Start the workers and a thread that restarts them when they exit."""
+        self._stopped.clear()
+        self._thread = Thread(
+            target=self._supervise, name="streamz-redis-supervisor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stop all workers, retiring ones included: ask them to stop, then kill the
+        ones that didn't in ``stop_timeout`` seconds.
+        """
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        with self._lock:
+            processes = list(self.processes.values()) + list(self._retiring.values())
+        for p in processes:
+            if p.is_alive():
+                p.terminate()
+        deadline = time.monotonic() + self.stop_timeout
+        for p in processes:
+            p.join(max(deadline - time.monotonic(), 0))
+            if p.is_alive():
+                logger.warning("Worker %s didn't stop in time, killing it", p.pid)
+                p.kill()
+                p.join()
+
+    def add_worker(self):
+        """Add a worker, it's started on the next check. Returns its index, or
+        ``None`` if the worker that had this index is still retiring.
+        """
+        with self._lock:
+            index = self.workers
+            if index in self._retiring:
+                return None
+            self.workers += 1
+            return index
+
+    def retire_worker(self):
+        """Retire the worker with the highest index. Returns its index, or ``None`` if
+        it's the only one.
+        """
+        with self._lock:
+            if self.workers <= 1:
+                return None
+            self.workers -= 1
+            index = self.workers
+            p = self.processes.pop(index, None)
+            if p is not None and p.is_alive():
+                self._retiring[index] = p
+                os.kill(p.pid, signal.SIGUSR1)
+            return index
+
+    @property
+    def alive(self) -> int:
+        """Number of running workers, not counting retiring ones."""
+        return sum(1 for p in self.processes.values() if p.is_alive())
+
+    @property
+    def retiring(self) -> set:
+        """Indexes of retired workers that haven't exited yet."""
+        return set(self._retiring)
+
+    def _supervise(self):
+        while not self._stopped.is_set():
+            with self._lock:
+                for i, p in list(self._retiring.items()):
+                    if not p.is_alive():
+                        p.join()
+                        del self._retiring[i]
+                for i in range(self.workers):
+                    p = self.processes.get(i)
+                    if p is not None and p.is_alive():
+                        continue
+                    if p is not None:
+                        logger.warning(
+                            "Worker %s (pid %s) exited with %s, restarting",
+                            i,
+                            p.pid,
+                            p.exitcode,
+                        )
+                        self.restarts += 1
+                    self.processes[i] = self._spawn(i)
+            self._stopped.wait(self.restart_delay)
+
+    def _spawn(self, index):
+        p = self._context.Process(
+            target=self._work, args=(index,), name=f"streamz-redis-worker-{index}"
+        )
+        p.daemon = True
+        # a worker that is stopped right after it's forked must still shut down
+        # gracefully, so signals are held until the worker is ready to handle them
+        signal.pthread_sigmask(signal.SIG_BLOCK, _SIGNALS)
+        try:
+            p.start()
+        finally:
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+        return p
+
+    def _work(self, index):
+        loop = IOLoop()
+        nodes = _graph(self.source)
+
+        def shutdown():
+            self.source.stop()
+            for node in nodes:
+                if isinstance(node, RedisSink):
+                    try:
+                        node.stop()
+                    except Exception:
+                        logger.exception("Failed to stop %s", node)
+            loop.add_callback(loop.stop)
+
+        @gen.coroutine
+        def retire():
+            drain = getattr(self.source, "drain", None)
+            if drain is not None:
+                yield drain()
+            shutdown()
+
+        # handlers run in the loop, the signals are unblocked once they're set up
+        loop.asyncio_loop.add_signal_handler(signal.SIGTERM, shutdown)
+        loop.asyncio_loop.add_signal_handler(signal.SIGUSR1, retire)
+        if self.setup is not None:
+            self.setup(index)
+        for node in nodes:
+            node.loop = None
+        self.source._inform_loop(loop)
+        for node in nodes:
+            if isinstance(node, RedisSink) and node._flusher is not None:
+                loop.add_callback(node._flusher.start)
+        loop.add_callback(self.source.start)
+        signal.pthread_sigmask(signal.SIG_UNBLOCK, _SIGNALS)
+        loop.start()
+        loop.close()
+        # everything is flushed by now, don't wait for reader threads that may be
+        # blocked on Redis
+        os._exit(0)
+
+
+class Autoscaler:
+    """Adds and retires workers of a ``Supervisor`` depending on the backlog of
+    their consumer group.
+
+    Every ``interval`` seconds, the backlog is measured as the ``lag`` (entries not
+    yet delivered to the group) plus the size of the group's PEL, summed over all
+    streams. If the backlog per worker is
+    above ``scale_up_at``, a worker is added, if it's below ``scale_down_at``, one
+    is retired. After a worker is added or retired, no more are added for
+    ``up_cooldown`` and none retired for ``down_cooldown`` seconds, so that the
+    new number of workers has time to show its effect.
+
+    A retired worker drains: it stops reading, finishes and acknowledges the
+    messages it has, and exits. Its consumer is then deleted from the group with
+    ``XGROUP DELCONSUMER``, but only once ``XINFO CONSUMERS`` shows it has nothing
+    pending, so no messages are lost. Messages left pending by a worker that didn't
+    finish them in time are claimed by peers if the workers send heartbeats, or
+    replayed by the next worker with this index.
+
+    Parameters
+    ----------
+    supervisor: Supervisor
+        Supervisor of the workers.
+    streams: list
+        Names of the streams the workers consume.
+    group: str
+        Name of the consumer group.
+    consumer_name: str
+        Consumer name of the source, workers are named ``<consumer_name>-<index>``.
+    client_params: dict
+        Parameters of ``redis-py`` client. The shared connection pool for these
+        parameters is used. Defaults to ``None``.
+    min_workers: int
+        The number of workers is never scaled down below this. Defaults to 1.
+    max_workers: int
+        The number of workers is never scaled up above this. Defaults to 4.
+    scale_up_at: int
+        Add a worker when the backlog per worker is above this. Defaults to 1000.
+    scale_down_at: int
+        Retire a worker when the backlog per worker is below this. Defaults to 100.
+    up_cooldown: int or float
+        Number of seconds after scaling during which no workers are added. Defaults
+        to 30.
+    down_cooldown: int or float
+        Number of seconds after scaling during which no workers are retired.
+        Defaults to 120.
+    interval: int or float
+        Number of seconds between checks. Defaults to 5.
+    """
+
+    def __init__(
+        self,
+        supervisor: Supervisor,
+        streams: list,
+        group: str,
+        consumer_name: str,
+        client_params: dict = None,
+        min_workers: int = 1,
+        max_workers: int = 4,
+        scale_up_at: int = 1000,
+        scale_down_at: int = 100,
+        up_cooldown: float = 30,
+        down_cooldown: float = 120,
+        interval: float = 5,
+    ):
+        if not 1 <= min_workers <= max_workers:
+            raise ValueError("must be 1 <= min_workers <= max_workers")
+        if scale_down_at >= scale_up_at:
+            raise ValueError("scale_down_at must be less than scale_up_at")
+        self.supervisor = supervisor
+        self.streams = list(streams)
+        self.group = group
+        self.consumer_name = consumer_name
+        self.client_params = client_params
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+        self.scale_up_at = scale_up_at
+        self.scale_down_at = scale_down_at
+        self.up_cooldown = up_cooldown
+        self.down_cooldown = down_cooldown
+        self.interval = interval
+        self.last_scaled = None
+        self.retired = set()
+        self._client = None
+        self._stopped = Event()
+        self._thread = None
+
+    @property
+    def redis(self):
+        if self._client is None:
+            self._client = get_client(self.client_params)
+        return self._client
+
+    def start(self):
+        """Start checking the backlog in a thread."""
+        self._stopped.clear()
+        self._thread = Thread(
+            target=self._run, name="streamz-redis-autoscaler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def measure(self) -> dict:
+        """Backlog of the group as a dict with ``lag`` and ``pending``, the number of
+        undelivered and of unacknowledged entries. Streams or groups that don't
+        exist yet count as 0.
+
+        The lag is reported by ``XINFO GROUPS`` since Redis 7. On older servers, or
+        when Redis can't tell it (e.g. after deletions), entries after the group's
+        last delivered id are counted with ``XRANGE``, up to the backlog at which
+        the maximum number of workers would be scaled up.
+        """
+        pipe = self.redis.pipeline(transaction=False)
+        for stream in self.streams:
+            pipe.xinfo_groups(stream)
+        lag, pending = 0, 0
+        unknown = []
+        for stream, groups in zip(self.streams, pipe.execute(raise_on_error=False)):
+            if isinstance(groups, Exception):
+                continue
+            for info in groups:
+                if _str(info["name"]) == self.group:
+                    pending += info["pending"]
+                    if info.get("lag") is None:
+                        unknown.append((stream, info["last-delivered-id"]))
+                    else:
+                        lag += info["lag"]
+        if len(unknown) > 0:
+            cap = self.scale_up_at * self.max_workers + 1
+            pipe = self.redis.pipeline(transaction=False)
+            for stream, last in unknown:
+                pipe.xrange(stream, str(StreamID.parse(last).next()), count=cap)
+            lag += sum(len(entries) for entries in pipe.execute())
+        return {"lag": lag, "pending": pending}
+
+    def check(self, now: float = None) -> int:
+        """Measure the backlog and scale once if needed. Returns the change in the
+        number of workers: 1, -1 or 0.
+        """
+        now = now if now is not None else time.monotonic()
+        backlog = self.measure()
+        backlog = backlog["lag"] + backlog["pending"]
+        workers = self.supervisor.workers
+        since = None if self.last_scaled is None else now - self.last_scaled
+        change = 0
+        if backlog / workers > self.scale_up_at and workers < self.max_workers:
+            if since is None or since >= self.up_cooldown:
+                index = self.supervisor.add_worker()
+                if index is not None:
+                    self.retired.discard(index)
+                    change = 1
+        elif backlog / workers < self.scale_down_at and workers > self.min_workers:
+            if since is None or since >= self.down_cooldown:
+                index = self.supervisor.retire_worker()
+                if index is not None:
+                    self.retired.add(index)
+                    change = -1
+        if change != 0:
+            self.last_scaled = now
+            logger.info(
+                "Backlog of %s is %s, scaled to %s workers",
+                self.group,
+                backlog,
+                self.supervisor.workers,
+            )
+        self.delete_retired()
+        return change
+
+    def delete_retired(self):
+        """Delete consumers of retired workers that exited and have nothing
+        pending.
+        """
+        retiring = self.supervisor.retiring
+        for index in list(self.retired):
+            if index in retiring:
+                continue
+            name = worker_name(self.consumer_name, index)
+            if self._count_pending(name) > 0:
+                continue
+            pipe = self.redis.pipeline(transaction=False)
+            for stream in self.streams:
+                pipe.xgroup_delconsumer(stream, self.group, name)
+            pipe.execute(raise_on_error=False)
+            self.retired.discard(index)
+
+    def _count_pending(self, name):
+        pipe = self.redis.pipeline(transaction=False)
+        for stream in self.streams:
+            pipe.xinfo_consumers(stream, self.group)
+        total = 0
+        for consumers in pipe.execute(raise_on_error=False):
+            if isinstance(consumers, Exception):
+                continue
+            total += sum(c["pending"] for c in consumers if _str(c["name"]) == name)
+        return total
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.check()
+            except Exception:
+                logger.exception("Autoscaler check failed")
+            self._stopped.wait(self.interval)